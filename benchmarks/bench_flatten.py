@@ -0,0 +1,27 @@
+"""Compare the compiled flattening plans with the reflective vars() walk they replaced
+
+The reflective walk is pycaomloader/tests/reference.py, which test_flatten checks
+gives the same fields.
+
+Usage: python benchmarks/bench_flatten.py [xml files...]
+"""
+
+import os
+import sys
+import timeit
+from caom2.obs_reader_writer import ObservationReader
+from pycaomloader.flatten import flatten_observation
+from pycaomloader.tests.reference import reference_observation
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'pycaomloader', 'data',
+                      'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a.xml')
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:] or [SAMPLE]
+    observations = [ObservationReader().read(f) for f in files]
+
+    n = 2000
+    for label, func in (('reflective', reference_observation), ('compiled', flatten_observation)):
+        seconds = min(timeit.repeat(lambda: [func(obs) for obs in observations], number=n, repeat=3))
+        print(f'{label:>10}: {1e6 * seconds / (n * len(observations)):.1f} us per observation')
@@ -0,0 +1,89 @@
+"""Per-stage ingest benchmarks on synthetic observations
+
+Times xml parsing (with and without XSD validation), flattening, writing with each
+insert backend and committing, separately, on a temporary SQLite database and
+optionally on PostgreSQL.
+
+Usage: python benchmarks/bench_ingest.py [-n 2000] [--planes 1] [--artifacts 2]
+       [--vertices 4] [--derived] [--postgres postgresql+psycopg2://localhost:5432/caom_bench]
+"""
+
+import io
+import os
+import time
+import argparse
+import tempfile
+from sqlalchemy.orm import Session
+from caom2.obs_reader_writer import ObservationReader
+from pycaomloader.load import load_engine, prepare_database, to_rows, WRITERS
+from pycaomloader.flatten import flatten_observation
+from synthetic import make_observations, to_xml
+
+
+def timed(func, *args) -> tuple:
+    """Call func, returning its result and the elapsed seconds"""
+
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def report(stage: str, seconds: float, n_obs: int, n_rows: int = 0):
+    rows = f'{n_rows / seconds:12,.0f} rows/s' if n_rows else ''
+    print(f'{stage:<28} {seconds:8.3f} s {n_obs / seconds:12,.0f} obs/s {rows}')
+
+
+def bench_writes(connection_string: str, items_list: list, backends: list):
+    """Time each backend's write and commit on a freshly created database"""
+
+    n_obs = len(items_list)
+    n_rows = sum(1 + sum(map(len, children)) for _, *children in items_list)
+    for backend in backends:
+        prepare_database(connection_string, drop_tables=True)
+        engine = load_engine(connection_string)
+        with Session(engine) as session:
+            _, write = timed(WRITERS[backend], session, items_list)
+            _, commit = timed(session.commit)
+        dialect = engine.dialect.name
+        report(f'{dialect} {backend} write', write, n_obs, n_rows)
+        report(f'{dialect} {backend} commit', commit, n_obs, n_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=2000, help='number of observations')
+    parser.add_argument('--planes', type=int, default=1, help='planes per observation')
+    parser.add_argument('--artifacts', type=int, default=2, help='artifacts per plane')
+    parser.add_argument('--parts', type=int, default=0, help='parts per artifact')
+    parser.add_argument('--chunks', type=int, default=0, help='chunks per part')
+    parser.add_argument('--vertices', type=int, default=4, help='polygon vertices')
+    parser.add_argument('--derived', action='store_true', help='generate derived observations')
+    parser.add_argument('--postgres', help='PostgreSQL connection string to also benchmark')
+    args = parser.parse_args()
+
+    observations = make_observations(args.n, n_planes=args.planes, n_artifacts=args.artifacts,
+                                     n_parts=args.parts, n_chunks=args.chunks,
+                                     n_vertices=args.vertices, derived=args.derived)
+    documents = [to_xml(obs) for obs in observations]
+    print(f'{args.n} observations, {sum(map(len, documents)) / args.n / 1024:.1f} KiB xml each')
+
+    reader = ObservationReader()
+    parsed, seconds = timed(lambda: [reader.read(io.BytesIO(doc)) for doc in documents])
+    report('xml parse', seconds, args.n)
+
+    reader = ObservationReader(validate=True)
+    _, seconds = timed(lambda: [reader.read(io.BytesIO(doc)) for doc in documents])
+    report('xml parse, validated', seconds, args.n)
+
+    items_list, seconds = timed(lambda: [to_rows(flatten_observation(obs)) for obs in parsed])
+    report('flatten', seconds, args.n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_writes(f"sqlite:///{os.path.join(tmp, 'bench.db')}", items_list, ['orm', 'core'])
+
+    if args.postgres:
+        bench_writes(args.postgres, items_list, ['orm', 'core', 'copy'])
+
+
+if __name__ == '__main__':
+    main()
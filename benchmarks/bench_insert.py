@@ -0,0 +1,65 @@
+"""Compare insert throughput of the ORM, Core and (PostgreSQL only) COPY backends
+
+Usage: python benchmarks/bench_insert.py [connection_string] [n_observations]
+"""
+
+import os
+import sys
+import time
+import uuid
+import tempfile
+from sqlalchemy.orm import Session
+from pycaomloader.load import load_engine, prepare_database, parse_file, row_columns, MODELS, WRITERS
+from pycaomloader.schema import CaomObservation, CaomPlane
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'pycaomloader', 'data',
+                      'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a.xml')
+
+
+def make_items(n: int) -> list:
+    """Copies of the flattened sample observation with fresh identifiers"""
+
+    obs_row, plane_rows, *_ = parse_file(SAMPLE)
+    i_obs = row_columns(CaomObservation).index('obsID')
+    i_plane, i_plane_obs = (row_columns(CaomPlane).index(c) for c in ('planeID', 'obsID'))
+    items_list = []
+    for _ in range(n):
+        obs_id = uuid.uuid4()
+        planes = []
+        for row in plane_rows:
+            row = list(row)
+            row[i_plane], row[i_plane_obs] = uuid.uuid4(), obs_id
+            planes.append(tuple(row))
+        row = list(obs_row)
+        row[i_obs] = obs_id
+        items_list.append((tuple(row), planes, *([] for _ in MODELS[2:])))
+    return items_list
+
+
+def run(connection_string: str, backend: str, items_list: list) -> float:
+    """Write and commit all observations, returning rows/sec"""
+
+    engine = load_engine(connection_string)
+    n_rows = sum(1 + len(planes) for _, planes, *_ in items_list)
+    start = time.perf_counter()
+    with Session(engine) as session:
+        WRITERS[backend](session, items_list)
+        session.commit()
+    return n_rows / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = ['orm', 'core']
+        if len(sys.argv) > 1 and sys.argv[1].startswith('postgresql'):
+            backends.append('copy')
+        for backend in backends:
+            if len(sys.argv) > 1:
+                connection_string = sys.argv[1]
+                prepare_database(connection_string, drop_tables=True)
+            else:
+                connection_string = f"sqlite:///{os.path.join(tmp, backend + '.db')}"
+                prepare_database(connection_string)
+            rate = run(connection_string, backend, make_items(n))
+            print(f'{backend:>5}: {rate:,.0f} rows/s')
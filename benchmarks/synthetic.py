@@ -0,0 +1,120 @@
+"""Generator of synthetic CAOM observations for benchmarks"""
+
+import io
+import math
+import random
+from datetime import datetime
+from caom2.observation import SimpleObservation, DerivedObservation, Algorithm, Proposal, \
+    Target, TargetType, Telescope, Instrument, ObservationIntentType
+from caom2.plane import Plane, Position, Energy, Time, Provenance, DataProductType, CalibrationLevel
+from caom2.artifact import Artifact, ReleaseType
+from caom2.part import Part
+from caom2.chunk import Chunk, ProductType
+from caom2.shape import Point, Polygon, MultiPolygon, Vertex, SegmentType, Interval, SubInterval
+from caom2.obs_reader_writer import ObservationWriter
+
+
+def make_polygon(ra: float, dec: float, radius: float, n_vertices: int) -> Polygon:
+    """Regular polygon around a position, with matching samples"""
+
+    points, vertices = [], []
+    for i in range(n_vertices):
+        angle = 2 * math.pi * i / n_vertices
+        cval1 = ra + radius * math.cos(angle) / math.cos(math.radians(dec))
+        cval2 = dec + radius * math.sin(angle)
+        points.append(Point(cval1, cval2))
+        vertices.append(Vertex(cval1, cval2, SegmentType.MOVE if i == 0 else SegmentType.LINE))
+    vertices.append(Vertex(points[0].cval1, points[0].cval2, SegmentType.CLOSE))
+
+    return Polygon(points=points, samples=MultiPolygon(vertices=vertices))
+
+
+def make_interval(lower: float, width: float, n_samples: int = 1) -> Interval:
+    """Interval split into contiguous samples"""
+
+    step = width / n_samples
+    samples = [SubInterval(lower + i * step, lower + (i + 1) * step) for i in range(n_samples)]
+    return Interval(lower, lower + width, samples=samples)
+
+
+def make_plane(obs_id: str, index: int, rng: random.Random,
+               n_artifacts: int, n_parts: int, n_chunks: int, n_vertices: int) -> Plane:
+    """Plane with position, energy and time bounds, and optionally artifacts, parts and chunks"""
+
+    plane = Plane(f'{obs_id}-plane{index}',
+                  creator_id=f'ivo://example.org/SYNTH?{obs_id}/plane{index}',
+                  meta_release=datetime(2020, 1, 1),
+                  data_release=datetime(2021, 1, 1),
+                  data_product_type=DataProductType.IMAGE,
+                  calibration_level=CalibrationLevel.CALIBRATED,
+                  provenance=Provenance('synthetic', version='1.0', producer='benchmarks'))
+
+    ra, dec = rng.uniform(0, 360), rng.uniform(-80, 80)
+    plane.position = Position(bounds=make_polygon(ra, dec, 0.05, n_vertices), time_dependent=False)
+    plane.energy = Energy(bounds=make_interval(rng.uniform(1e-7, 1e-6), 5e-8), bandpass_name='F555W')
+    plane.time = Time(bounds=make_interval(rng.uniform(50000, 60000), 0.01), exposure=600.0)
+
+    for a in range(n_artifacts):
+        uri = f'ex:SYNTH/{obs_id}/plane{index}/file{a}.fits'
+        art = Artifact(uri, ProductType.SCIENCE, ReleaseType.DATA,
+                       content_type='application/fits', content_length=rng.randint(1, 1 << 30))
+        for p in range(n_parts):
+            part = Part(str(p), product_type=ProductType.SCIENCE)
+            for _ in range(n_chunks):
+                part.chunks.append(Chunk(product_type=ProductType.SCIENCE, naxis=2,
+                                         position_axis_1=1, position_axis_2=2))
+            art.parts.add(part)
+        plane.artifacts.add(art)
+
+    return plane
+
+
+def make_observation(index: int = 0,
+                     n_planes: int = 1,
+                     n_artifacts: int = 2,
+                     n_parts: int = 0,
+                     n_chunks: int = 0,
+                     n_vertices: int = 4,
+                     derived: bool = False,
+                     seed: int = 0):
+    """Synthetic simple or derived observation
+
+    The number of planes, artifacts per plane, parts per artifact, chunks per part and
+    polygon vertices control the size and shape complexity.
+    """
+
+    rng = random.Random(seed * 1000003 + index)
+    obs_id = f'synth_{index:08d}'
+    if derived:
+        obs = DerivedObservation('SYNTH', obs_id, Algorithm('drizzle'))
+    else:
+        obs = SimpleObservation('SYNTH', obs_id)
+
+    obs.intent = ObservationIntentType.SCIENCE
+    obs.type = 'OBJECT'
+    obs.meta_release = datetime(2020, 1, 1)
+    obs.proposal = Proposal(f'{rng.randint(1000, 99999)}', pi_name='Synthetic, P.', project='BENCH')
+    obs.target = Target(f'target{index}', target_type=TargetType.OBJECT, standard=False, moving=False)
+    obs.telescope = Telescope('SYNTH')
+    obs.instrument = Instrument('IMAGER')
+    obs.instrument.keywords.update({'FILTER=F555W', 'DETECTOR=CCD'})
+
+    for p in range(n_planes):
+        plane = make_plane(obs_id, p, rng, n_artifacts, n_parts, n_chunks, n_vertices)
+        obs.planes[plane.product_id] = plane
+
+    return obs
+
+
+def make_observations(n: int, **kwargs) -> list:
+    """A list of n synthetic observations, see make_observation for the options"""
+
+    return [make_observation(i, **kwargs) for i in range(n)]
+
+
+def to_xml(obs) -> bytes:
+    """Serialize an observation to CAOM xml"""
+
+    out = io.BytesIO()
+    ObservationWriter().write(obs, out)
+    return out.getvalue()
@@ -0,0 +1,209 @@
+"""Asyncio ingest of CAOM observations with SQLAlchemy async sessions
+
+Requires the async extra (asyncpg for PostgreSQL or aiosqlite for SQLite).
+
+Many sources are fetched and parsed concurrently while a bounded number of writers,
+each with its own AsyncSession, commit batches, so one process can keep both the
+network and the database busy without blocking the event loop::
+
+    async def fetch(key):
+        return await bucket.get(key)
+
+    await ingest_files_async(keys, 'postgresql+asyncpg://localhost:5432/caom', fetch=fetch)
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+from sqlalchemy import AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from pycaomloader.load import WRITERS, attach_sqlite, sqlite_in_memory, write_batch, record_failure, ingest_summary, \
+    _parse_worker
+from pycaomloader.ledger import committed_files, remaining, source_name
+from pycaomloader.stats import IngestStats
+
+logger = logging.getLogger(__name__)
+
+# Async drivers used in place of the blocking ones
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg',
+                 'sqlite': 'sqlite+aiosqlite'}
+
+
+def load_async_engine(connection_string: str, **kwargs) -> AsyncEngine:
+    """Create SQLAlchemy async engine, switching to the async driver of the database
+
+    Keyword arguments are passed on to create_async_engine.
+    """
+
+    url = make_url(connection_string)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend}, expected one of {list(ASYNC_DRIVERS)}')
+
+    # Special handling for sqlite, see load.load_engine
+    # aiosqlite defaults to one connection shared by all sessions, so concurrent writers
+    # would commit or roll back each other's batches, each needs its own connection
+    if backend == 'sqlite':
+        if sqlite_in_memory(url):
+            raise ValueError('In-memory SQLite databases are private to one connection, use a file')
+        kwargs.setdefault('poolclass', AsyncAdaptedQueuePool)
+        engine = create_async_engine(f'{ASYNC_DRIVERS[backend]}://', **kwargs)
+        attach_sqlite(engine.sync_engine, url.database)
+        return engine
+
+    return create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]), **kwargs)
+
+
+async def _aiter(sources: Union[Iterable, AsyncIterable]):
+    if hasattr(sources, '__aiter__'):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+
+async def skip_completed_async(engine: AsyncEngine,
+                               sources: Union[Iterable, AsyncIterable],
+                               chunk_size: int = 1000,
+                               stats: Optional[IngestStats] = None):
+    """Drop the sources committed according to the ledger, see ledger.skip_completed"""
+
+    chunk = []
+    async for source in _aiter(sources):
+        chunk.append(source)
+        if len(chunk) >= chunk_size:
+            for pending in await _remaining(engine, chunk, stats):
+                yield pending
+            chunk = []
+
+    if chunk:
+        for pending in await _remaining(engine, chunk, stats):
+            yield pending
+
+
+async def _remaining(engine: AsyncEngine, chunk: list, stats: Optional[IngestStats]) -> list:
+    async with engine.connect() as conn:
+        done = await conn.run_sync(committed_files, [source_name(s) for s in chunk])
+    return remaining(chunk, done, stats)
+
+
+async def ingest_files_async(sources: Union[Iterable, AsyncIterable],
+                             connection_string: str,
+                             fetch: Optional[Callable[[Any], Awaitable[bytes]]] = None,
+                             concurrency: int = 16,
+                             workers: int = 1,
+                             writers: int = 2,
+                             batch_size: int = 500,
+                             queue_size: Optional[int] = None,
+                             backend: str = 'core',
+                             incremental: bool = False,
+                             ledger: bool = False,
+                             resume: bool = False,
+                             validate: Union[bool, float] = False,
+                             stats: Optional[IngestStats] = None) -> dict:
+    """Ingest observations from an iterable or async iterable of sources
+
+    Sources are file names or (name, xml content) pairs, or names passed to the fetch
+    coroutine function when one is given, eg to download them from object storage.
+    Up to concurrency sources are fetched and parsed at once, parsing in a pool of
+    worker processes if workers > 1 or in threads otherwise, and at most queue_size
+    parsed files wait for the writers. The backend, incremental, ledger, resume and validate
+    options are those of load.ingest_files, except that COPY is not available.
+    """
+
+    if backend not in WRITERS or backend == 'copy':
+        raise ValueError(f'Unknown backend {backend}, expected one of {[w for w in WRITERS if w != "copy"]}')
+    if incremental:
+        backend = 'upsert'
+    if stats is None:
+        stats = IngestStats()
+    if queue_size is None:
+        queue_size = 4 * concurrency
+
+    engine = load_async_engine(connection_string)
+    if resume:
+        ledger = True
+        sources = skip_completed_async(engine, sources, stats=stats)
+    failures = []
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    limit = asyncio.Semaphore(concurrency)
+    parsed = asyncio.Queue(maxsize=queue_size)
+    batches = asyncio.Queue(maxsize=writers)
+
+    async def process(source):
+        # The semaphore is held until the result is queued so waiting results stay bounded
+        try:
+            if fetch is not None:
+                with stats.stage('fetch'):
+                    source = (str(source), await fetch(source))
+            result = await loop.run_in_executor(executor, _parse_worker, source, ledger, validate)
+        except Exception as e:  # pylint: disable=broad-except
+            result = (str(source), None, str(e), None, None)
+        try:
+            await parsed.put(result)
+        finally:
+            limit.release()
+
+    async def produce():
+        tasks = set()
+        async for source in _aiter(sources):
+            await limit.acquire()
+            task = asyncio.create_task(process(source))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        await parsed.put(None)
+
+    async def batch_results():
+        batch = []
+        while (result := await parsed.get()) is not None:
+            file_name, items, error, measured, info = result
+            if measured is not None:
+                stats.merge(measured)
+            if error is not None:
+                logger.warning('Failed to process %s: %s', file_name, error)
+                stats.count('failed')
+                if info is not None:
+                    failures.append((info, error))
+                continue
+
+            batch.append((file_name, items, info))
+            if len(batch) >= batch_size:
+                await batches.put(batch)
+                batch = []
+
+        if batch:
+            await batches.put(batch)
+        for _ in range(writers):
+            await batches.put(None)
+
+    async def write():
+        async with AsyncSession(engine) as session:
+            while (batch := await batches.get()) is not None:
+                await session.run_sync(write_batch, batch, backend, incremental, stats)
+
+    tasks = [asyncio.create_task(coro) for coro in (produce(), batch_results(), *(write() for _ in range(writers)))]
+    try:
+        await asyncio.gather(*tasks)
+        if failures:
+            async with AsyncSession(engine) as session:
+                for info, error in failures:
+                    await session.run_sync(record_failure, info, error)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if executor is not None:
+            executor.shutdown()
+        await engine.dispose()
+
+    return ingest_summary(stats)
+
+
+async def ingest_observation_async(source: Union[str, tuple], connection_string: str, **kwargs) -> dict:
+    """Ingest an observation from an xml file or a (name, xml content) pair without blocking the event loop"""
+
+    return await ingest_files_async([source], connection_string, **kwargs)
@@ -0,0 +1,166 @@
+"""Command line interface
+
+Examples::
+
+    pycaomloader init --db postgresql+psycopg2://localhost:5432/caom
+    pycaomloader ingest --db postgresql+psycopg2://localhost:5432/caom --workers 8 --backend copy data/
+    pycaomloader ingest --db sqlite:///caom.db --incremental --resume --profile --profile-output ingest.prof hst.tar.gz
+    zcat dump.xml.gz | pycaomloader ingest --db sqlite:///caom.db -
+
+The connection string may also be given with the PYCAOMLOADER_DB environment variable.
+"""
+
+import os
+import sys
+import asyncio
+import cProfile
+import logging
+import argparse
+import pstats
+from typing import Iterator, Optional, Sequence, Union
+from pycaomloader.load import WRITERS, prepare_database, ingest_files, find_xml_files
+from pycaomloader.sources import iter_sources
+from pycaomloader.stats import IngestStats
+
+logger = logging.getLogger(__name__)
+
+
+def iter_paths(paths: Sequence[str]) -> Iterator[Union[str, tuple]]:
+    """Sources of the command line paths
+
+    Directories are searched for xml files. Files, single or concatenated xml documents,
+    tar/zip archives or compressed xml, are streamed with sources.iter_sources, as is
+    standard input for -.
+    """
+
+    for path in paths:
+        if path == '-':
+            yield from iter_sources(sys.stdin.buffer)
+        elif os.path.isdir(path):
+            yield from find_xml_files(path)
+        else:
+            yield from iter_sources(path)
+
+
+def _validate(value: str) -> Union[bool, float]:
+    if value.lower() in ('all', 'true', 'yes'):
+        return True
+    if value.lower() in ('none', 'false', 'no'):
+        return False
+    fraction = float(value)
+    if not 0 <= fraction <= 1:
+        raise argparse.ArgumentTypeError('expected all, none or a fraction between 0 and 1')
+    return fraction
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='pycaomloader', description='SQLAlchemy Loader for CAOM2')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='more logging, repeat for debug')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    db = argparse.ArgumentParser(add_help=False)
+    db.add_argument('--db', default=os.environ.get('PYCAOMLOADER_DB'),
+                    help='SQLAlchemy connection string (default: $PYCAOMLOADER_DB)')
+
+    init = commands.add_parser('init', parents=[db], help='create the database tables')
+    init.add_argument('--drop', action='store_true', help='drop the existing tables first')
+
+    ingest = commands.add_parser('ingest', parents=[db], help='load observation xml files')
+    ingest.add_argument('paths', nargs='+',
+                        help='xml files, directories, archives, compressed or concatenated xml, or - for stdin')
+    ingest.add_argument('-w', '--workers', type=int, default=1, help='parser processes (default: %(default)s)')
+    ingest.add_argument('-b', '--batch-size', type=int, default=500,
+                        help='observations per commit (default: %(default)s)')
+    ingest.add_argument('--queue-size', type=int,
+                        help='parsed files waiting for the writer (default: 4 x workers, or 4 x concurrency with --async)')
+    ingest.add_argument('--backend', choices=list(WRITERS), default='core',
+                        help='how rows are written (default: %(default)s)')
+    ingest.add_argument('--incremental', action='store_true',
+                        help='skip unchanged observations and upsert the others')
+    ingest.add_argument('--ledger', action='store_true', help='record every file in the ingest ledger')
+    ingest.add_argument('--resume', action='store_true',
+                        help='skip files the ledger has as committed (implies --ledger)')
+    ingest.add_argument('--validate', type=_validate, default=False, metavar='{all,none,FRACTION}',
+                        help='XSD validation of all, none (default) or a fraction of the files')
+    ingest.add_argument('--prepare', action='store_true', help='create missing tables first')
+    ingest.add_argument('--async', dest='use_async', action='store_true',
+                        help='use the asyncio pipeline (requires the async extra)')
+    ingest.add_argument('--concurrency', type=int, default=16,
+                        help='files fetched and parsed at once with --async (default: %(default)s)')
+    ingest.add_argument('--writers', type=int, default=2,
+                        help='concurrent database writers with --async (default: %(default)s)')
+    ingest.add_argument('--profile', action='store_true',
+                        help='profile this process with cProfile and print the stage timings')
+    ingest.add_argument('--profile-output', metavar='FILE', help='save the cProfile stats to FILE (implies --profile)')
+
+    return parser
+
+
+def print_stages(stats: IngestStats, file=sys.stderr):
+    """Print the stage timings and counters of an ingest run"""
+
+    print(f"{'stage':<30} {'wall s':>10} {'cpu s':>10} {'calls':>8}", file=file)
+    for name in sorted(stats.wall, key=stats.wall.get, reverse=True):
+        print(f'{name:<30} {stats.wall[name]:10.3f} {stats.cpu[name]:10.3f} {stats.calls[name]:8d}', file=file)
+    for name, n in sorted(stats.counters.items()):
+        print(f'{name:<30} {n:>10}', file=file)
+
+
+def ingest(args: argparse.Namespace) -> dict:
+    """Run the ingest command"""
+
+    if args.prepare:
+        prepare_database(args.db)
+
+    sources = iter_paths(args.paths)
+    stats = IngestStats()
+    options = dict(batch_size=args.batch_size, workers=args.workers, queue_size=args.queue_size,
+                   incremental=args.incremental, ledger=args.ledger, resume=args.resume,
+                   validate=args.validate, stats=stats)
+
+    profile = cProfile.Profile() if args.profile or args.profile_output else None
+    if profile is not None:
+        profile.enable()
+    try:
+        if args.use_async:
+            # Imported here as it needs the async extra
+            from pycaomloader.aio import ingest_files_async  # pylint: disable=import-outside-toplevel
+            summary = asyncio.run(ingest_files_async(sources, args.db, backend=args.backend,
+                                                     concurrency=args.concurrency, writers=args.writers,
+                                                     **options))
+        else:
+            summary = ingest_files(sources, args.db, backend=args.backend, **options)
+    finally:
+        if profile is not None:
+            profile.disable()
+
+    if profile is not None:
+        if args.profile_output:
+            profile.dump_stats(args.profile_output)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+        print_stages(stats)
+
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING - 10 * min(args.verbose, 2),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if not args.db:
+        logger.error('No database, use --db or set PYCAOMLOADER_DB')
+        return 2
+
+    if args.command == 'init':
+        prepare_database(args.db, drop_tables=args.drop)
+        return 0
+
+    summary = ingest(args)
+    print(f"{summary['files']} files loaded, {summary['failed']} failed, {summary['skipped']} skipped "
+          f"in {summary['seconds']:.1f} s ({summary['files_per_sec']:.1f} files/s)")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Columnar export of observations and planes to Parquet
+
+Requires the parquet extra (pyarrow).
+
+Rows are read either from the database, streamed yield_per rows at a time, or straight
+from xml sources through the same flattening as the ingest, and written as Arrow record
+batches to Parquet files partitioned hive style by collection and release date::
+
+    export/Plane/collection=HST/release_date=2019-05/part-0.parquet
+
+Memory is bounded by max_rows buffered rows and max_open open files across all
+partitions, whatever the size and time span of a collection. Columns keep their TAP
+names and their types come from the Mapped[] annotations in schema.py. The files can
+be read back with the partition columns using pyarrow.dataset.dataset(path,
+partitioning='hive').
+"""
+
+import os
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Iterator, Union, get_args
+from urllib.parse import quote
+from uuid import UUID
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from pycaomloader.schema import CaomObservation, CaomPlane
+from pycaomloader.load import load_engine, parse_files, row_dicts, column_map
+
+logger = logging.getLogger(__name__)
+
+# Arrow types of the Python types used in Mapped[] annotations
+# UUIDs are stored as their string form
+ARROW_TYPES = {str: pa.string(),
+               int: pa.int64(),
+               float: pa.float64(),
+               bool: pa.bool_(),
+               datetime: pa.timestamp('us'),
+               UUID: pa.string()}
+
+# Tables that can be exported
+EXPORT_MODELS = (CaomObservation, CaomPlane)
+
+# Hive partition columns, taken out of the files themselves
+PARTITION_COLUMNS = ('collection', 'release_date')
+
+# Partition value of missing collections or release dates
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def python_type(model: type, key: str) -> type:
+    """Python type of an ORM attribute from its Mapped[] annotation, without Optional"""
+
+    for cls in model.__mro__:
+        annotation = cls.__dict__.get('__annotations__', {}).get(key)
+        if annotation is not None:
+            break
+    else:
+        raise ValueError(f'No annotation for {model.__name__}.{key}')
+
+    (inner,) = get_args(annotation)
+    types = [t for t in get_args(inner) if t is not type(None)]
+    return types[0] if types else inner
+
+
+def arrow_schema(model: type) -> pa.Schema:
+    """Arrow schema of the table of a model, keyed by column name, without the partition columns"""
+
+    return pa.schema([pa.field(col, ARROW_TYPES[python_type(model, attr)])
+                      for attr, col in column_map(model).items() if col not in PARTITION_COLUMNS])
+
+
+class ParquetExporter:
+    """Write rows of one table to Parquet files partitioned by collection and release date
+
+    Rows are dictionaries keyed by column name that must include collection and
+    metaRelease. Rows are buffered per partition and written as one row group every
+    batch_size rows. The release date partition is metaRelease formatted with release_format.
+
+    When more than max_rows rows are buffered across partitions the largest buffer is
+    written early, and at most max_open files are open at once, closing the least recently
+    written. A partition written to again after its file was closed continues in a new
+    part-<n>.parquet file.
+    """
+
+    def __init__(self, path: str, model: type,
+                 batch_size: int = 10000,
+                 max_rows: int = 100000,
+                 max_open: int = 64,
+                 release_format: str = '%Y-%m',
+                 compression: str = 'zstd'):
+        self.path = os.path.join(path, model.__tablename__)
+        self.schema = arrow_schema(model)
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_open = max_open
+        self.release_format = release_format
+        self.compression = compression
+        self.rows = 0
+        self._uuid_columns = [col for attr, col in column_map(model).items() if python_type(model, attr) is UUID]
+        self._buffers = {}
+        self._buffered = 0
+        self._writers = OrderedDict()
+        self._parts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def partition(self, row: dict) -> tuple:
+        release = row.get('metaRelease')
+        return row.get('collection'), None if release is None else release.strftime(self.release_format)
+
+    def write(self, row: dict):
+        key = self.partition(row)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(row)
+        self._buffered += 1
+        if len(buffer) >= self.batch_size:
+            self.flush(key)
+        elif self._buffered > self.max_rows:
+            self.flush(max(self._buffers, key=lambda k: len(self._buffers[k])))
+
+    def write_rows(self, rows: Iterable[dict]):
+        for row in rows:
+            self.write(row)
+
+    def flush(self, key: tuple):
+        """Write the buffered rows of a partition as a record batch"""
+
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        self._buffered -= len(rows)
+
+        for row in rows:
+            for col in self._uuid_columns:
+                if row[col] is not None:
+                    row[col] = str(row[col])
+
+        writer = self._writers.get(key)
+        if writer is None:
+            if len(self._writers) >= self.max_open:
+                _, oldest = self._writers.popitem(last=False)
+                oldest.close()
+            directory = os.path.join(self.path, *(f'{name}={NULL_PARTITION if v is None else quote(v, safe="")}'
+                                                  for name, v in zip(PARTITION_COLUMNS, key)))
+            os.makedirs(directory, exist_ok=True)
+            part = self._parts[key] = self._parts.get(key, -1) + 1
+            writer = self._writers[key] = pq.ParquetWriter(os.path.join(directory, f'part-{part}.parquet'),
+                                                           self.schema, compression=self.compression)
+        else:
+            self._writers.move_to_end(key)
+
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        for key in list(self._buffers):
+            self.flush(key)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+def select_table(model: type, collection: Union[str, Iterable[str], None] = None):
+    """Statement selecting all the columns of a table, with the collection of planes
+
+    Rows are ordered by partition so each one is written out before the next starts.
+    """
+
+    if model is CaomObservation:
+        stmt = select(CaomObservation.__table__)
+    else:
+        stmt = select(model.__table__, CaomObservation.collection).join(model.observation)
+
+    if collection is not None:
+        stmt = stmt.where(CaomObservation.collection.in_([collection] if isinstance(collection, str) else collection))
+    return stmt.order_by(CaomObservation.collection, model.__table__.c.metaRelease)
+
+
+def database_rows(session: Session, model: type,
+                  collection: Union[str, Iterable[str], None] = None,
+                  yield_per: int = 10000) -> Iterator[dict]:
+    """Stream the rows of a table, keyed by column name, yield_per at a time"""
+
+    result = session.execute(select_table(model, collection).execution_options(yield_per=yield_per))
+    for partition in result.mappings().partitions():
+        for row in partition:
+            yield dict(row)
+
+
+def export_database(connection_string: str,
+                    path: str,
+                    collection: Union[str, Iterable[str], None] = None,
+                    models: tuple = EXPORT_MODELS,
+                    batch_size: int = 10000,
+                    **kwargs) -> dict:
+    """Export the observations and planes of a database, or of some collections, to Parquet
+
+    Keyword arguments are passed on to ParquetExporter. Returns the rows written per table.
+    """
+
+    counts = {}
+    with Session(load_engine(connection_string)) as session:
+        for model in models:
+            with ParquetExporter(path, model, batch_size=batch_size, **kwargs) as exporter:
+                exporter.write_rows(database_rows(session, model, collection, yield_per=batch_size))
+            counts[model.__tablename__] = exporter.rows
+
+    return counts
+
+
+def export_files(paths: Iterable[Union[str, tuple]],
+                 path: str,
+                 workers: int = 1,
+                 batch_size: int = 10000,
+                 **kwargs) -> dict:
+    """Export observations and planes of xml files to Parquet without going through a database
+
+    Sources are parsed as by load.ingest_files, in one pass for both tables. Keyword arguments
+    are passed on to ParquetExporter. Returns the rows written per table and failed files.
+    """
+
+    counts = {'failed': 0}
+    with ParquetExporter(path, CaomObservation, batch_size=batch_size, **kwargs) as observations, \
+            ParquetExporter(path, CaomPlane, batch_size=batch_size, **kwargs) as planes:
+        for file_name, items, error, _ in parse_files(paths, workers=workers):
+            if error is not None:
+                logger.warning('Failed to process %s: %s', file_name, error)
+                counts['failed'] += 1
+                continue
+
+            (obs_row,) = row_dicts(CaomObservation, [items[0]])
+            observations.write(obs_row)
+            for row in row_dicts(CaomPlane, items[1]):
+                row['collection'] = obs_row['collection']
+                planes.write(row)
+
+    counts[CaomObservation.__tablename__] = observations.rows
+    counts[CaomPlane.__tablename__] = planes.rows
+    return counts
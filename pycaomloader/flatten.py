@@ -0,0 +1,343 @@
+"""Precompiled plans for flattening CAOM objects into table fields
+
+Instead of inspecting every attribute of every object, the attributes of each CAOM
+class are inspected once and turned into a list of steps that copy or transform a
+value straight into its field name. Steps whose handling depends on the runtime
+type of a value (shapes, keyword sets, ...) look it up in a per-type cache.
+"""
+
+# pylint: disable=protected-access
+
+from enum import Enum
+from functools import partial
+from typing import Any, Callable
+from datetime import datetime
+from caom2.observation import Observation
+from caom2.plane import Plane, Position, Time, Energy, Metrics, Polarization, CustomAxis
+from caom2.artifact import Artifact
+from caom2.part import Part
+from caom2.chunk import Chunk, SpatialWCS, SpectralWCS, TemporalWCS, PolarizationWCS, CustomWCS, ObservableAxis
+from caom2.shape import Point, Circle, Polygon, Interval
+from caom2.wcs import Axis, Coord2D, CoordAxis1D, CoordAxis2D, CoordCircle2D, CoordError, CoordFunction1D, \
+    CoordFunction2D, CoordRange1D, CoordRange2D, Dimension2D, RefCoord, Slice, ValueCoord2D
+from pycaomloader.geometry import BOUNDS_HANDLERS
+
+# Attributes of observations and planes that are flattened with a prefix
+NESTED_FIELDS = ('target', 'targetPosition', 'proposal', 'telescope', 'environment', 'instrument',
+                 'provenance', 'position', 'time', 'energy', 'metrics', 'polarization', 'custom')
+
+# Attributes of chunks that are flattened with a prefix
+WCS_FIELDS = ('position', 'energy', 'time', 'polarization', 'custom', 'observable')
+
+# Attributes handled separately or not stored
+SKIPPED_FIELDS = ('planes', 'artifacts', 'parts', 'chunks', 'members')
+
+# Nested types that are drilled into
+NESTED_TYPES = (Point, Circle, Polygon, Interval, Position, Time, Energy, Metrics, Polarization, CustomAxis)
+
+# Nested types of chunks that are drilled into
+WCS_TYPES = (SpatialWCS, SpectralWCS, TemporalWCS, PolarizationWCS, CustomWCS, ObservableAxis, Axis, Slice,
+             CoordAxis1D, CoordAxis2D, CoordError, CoordRange1D, CoordRange2D, CoordFunction1D, CoordFunction2D,
+             Coord2D, RefCoord, ValueCoord2D, Dimension2D, CoordCircle2D)
+
+# Types stored as they are
+SCALAR_TYPES = (str, int, float, type(None), bool, datetime)
+
+# CAOM objects reduced to the attribute, or dotted path of attributes, stored in the database
+PLAIN_FIELDS = {'algorithm': 'name',
+                'requirements': 'flag.value',
+                'calibration_level': 'value',
+                'data_product_type': 'value',
+                'product_type': 'value',
+                'release_type': 'value'}
+
+# Fields stored under a different name
+# The chunk axis numbers would otherwise clash with the flattened WCS axes, eg energy_axis
+RENAMED_FIELDS = {'target_position': 'targetPosition',
+                  'position_axis_1': 'positionAxis1',
+                  'position_axis_2': 'positionAxis2',
+                  'energy_axis': 'energyAxis',
+                  'time_axis': 'timeAxis',
+                  'polarization_axis': 'polarizationAxis',
+                  'observable_axis': 'observableAxis',
+                  'custom_axis': 'customAxis'}
+
+# Compiled plans by class (top level) or by class and prefix (nested)
+_TOP_PLANS = {}
+_NESTED_PLANS = {}
+
+# Handler for values of nested objects by the nested types in use and their type
+_TYPE_HANDLERS = {}
+
+
+def rename_fields(k: str) -> str:
+    """Helper function to rename some fields"""
+
+    return RENAMED_FIELDS.get(k, k)
+
+
+def flatten_fields(obj: Any, nested_fields: tuple = NESTED_FIELDS, nested_types: tuple = NESTED_TYPES) -> dict:
+    """Flatten the attributes of an observation, plane, artifact, part or chunk into a dictionary of fields"""
+
+    plan = _TOP_PLANS.get(obj.__class__)
+    if plan is None:
+        plan = _TOP_PLANS[obj.__class__] = compile_top_plan(obj, nested_fields, nested_types)
+
+    field_items = {}
+    d = obj.__dict__
+    for step in plan:
+        step(field_items, d)
+    return field_items
+
+
+def flatten_nested(field_items: dict, k: str, v: Any, nested_types: tuple = NESTED_TYPES):
+    """Flatten a nested object into fields starting with prefix k"""
+
+    if v is None:
+        field_items[k] = v
+        return
+
+    plan = _NESTED_PLANS.get((v.__class__, k))
+    if plan is None:
+        plan = _NESTED_PLANS[(v.__class__, k)] = compile_nested_plan(v, k, nested_types)
+
+    d = v.__dict__
+    for step in plan:
+        step(field_items, d)
+
+
+def compile_top_plan(obj: Any, nested_fields: tuple = NESTED_FIELDS, nested_types: tuple = NESTED_TYPES) -> list:
+    """Build the flattening steps for an observation, plane, artifact, part or chunk class"""
+
+    plan = []
+    for attr in vars(obj):
+        # strip starting _ for simplicity and rename some fields
+        k = rename_fields(attr[1:] if attr.startswith('_') else attr)
+
+        if k in SKIPPED_FIELDS or k.endswith('read_groups'):
+            continue
+        if k in nested_fields:
+            plan.append(_nested_step(attr, k, nested_types))
+        elif k in PLAIN_FIELDS or k == 'intent':
+            plan.append(_plain_step(attr, k, PLAIN_FIELDS.get(k, 'value')))
+        elif 'checksum' in k.lower() or 'uri' in k.lower():
+            plan.append(_plain_step(attr, k, 'uri'))
+        else:
+            plan.append(_copy_step(attr, k))
+
+    return plan
+
+
+def compile_nested_plan(obj: Any, prefix: str, nested_types: tuple = NESTED_TYPES) -> list:
+    """Build the flattening steps for a nested class at a given prefix"""
+
+    plan = []
+    for attr in vars(obj):
+        k = prefix + attr
+        if attr.endswith('points') or attr.endswith('samples'):
+            # Stored with their shape by geometry.BOUNDS_HANDLERS, except for chunk WCS bounds
+            continue
+        if attr.endswith('bounds'):
+            plan.append(_bounds_step(attr, k, nested_types))
+        else:
+            plan.append(_typed_step(attr, k, nested_types))
+
+    return plan
+
+
+def _copy_step(attr: str, k: str) -> Callable:
+    def step(field_items, d):
+        field_items[k] = d[attr]
+    return step
+
+
+def _plain_step(attr: str, k: str, name: str) -> Callable:
+    names = name.split('.')
+
+    def step(field_items, d):
+        v = d[attr]
+        if v is not None:
+            for n in names:
+                v = getattr(v, n, v)
+        field_items[k] = v
+    return step
+
+
+def _nested_step(attr: str, k: str, nested_types: tuple) -> Callable:
+    def step(field_items, d):
+        flatten_nested(field_items, k, d[attr], nested_types)
+    return step
+
+
+def _bounds_step(attr: str, k: str, nested_types: tuple) -> Callable:
+    def step(field_items, d):
+        v = d[attr]
+        handler = BOUNDS_HANDLERS.get(v.__class__)
+        if handler is None:
+            # No bounds, or chunk WCS bounds
+            flatten_nested(field_items, k, v, nested_types)
+        else:
+            handler(field_items, k, v)
+    return step
+
+
+def _typed_step(attr: str, k: str, nested_types: tuple) -> Callable:
+    handlers = _TYPE_HANDLERS.setdefault(nested_types, {})
+
+    def step(field_items, d):
+        v = d[attr]
+        handler = handlers.get(v.__class__)
+        if handler is None:
+            handler = handlers[v.__class__] = _type_handler(v.__class__, nested_types)
+        handler(field_items, k, v)
+    return step
+
+
+def _store(field_items: dict, k: str, v: Any):
+    field_items[k] = v
+
+
+def _join(field_items: dict, k: str, v: Any):
+    # Enumerations such as polarization states are joined by value
+    temp = ' | '.join([getattr(x, 'value', x) for x in v])
+    if temp.strip() != '':
+        # Don't store empty strings
+        field_items[k] = temp
+
+
+def _value(field_items: dict, k: str, v: Any):
+    # Enumerations such as the target type are stored by value
+    field_items[k] = v.value
+
+
+def _drop(field_items: dict, k: str, v: Any):
+    pass
+
+
+def _type_handler(cls: type, nested_types: tuple = NESTED_TYPES) -> Callable:
+    """Pick how values of a type found in a nested object are flattened"""
+
+    if issubclass(cls, nested_types):
+        return partial(flatten_nested, nested_types=nested_types)
+    if issubclass(cls, Enum):
+        return _value
+    if issubclass(cls, SCALAR_TYPES):
+        return _store
+    if issubclass(cls, (set, list)):
+        return _join
+    return _drop
+
+
+def flatten_observation(obs: Observation) -> tuple:
+    """Flatten an observation into plain field dictionaries for it and its planes, artifacts, parts,
+    chunks, members, provenance inputs and read groups
+
+    The observation fields are followed by one list of dictionaries per child table,
+    parents before children.
+    """
+
+    field_items = flatten_fields(obs)
+
+    # Set the type code based on whether this is Derived or Simple
+    if 'Derived' in obs.__class__.__name__ or 'Composite' in obs.__class__.__name__:
+        field_items['typeCode'] = 'D'
+    else:
+        field_items['typeCode'] = 'S'
+
+    # Members are stored both as link rows and joined in the members column
+    members = getattr(obs, 'members', None)
+    if members:
+        field_items['members'] = join_uris(members)
+
+    plane_items, artifact_items, part_items, chunk_items, input_items = [], [], [], [], []
+    plane_meta_groups, plane_data_groups = [], []
+    for plane in obs.planes.values():
+        plane_items.append(flatten_plane(plane, obs.collection, obs.observation_id, obs._id))
+        input_items.extend(flatten_inputs(plane))
+        plane_meta_groups.extend(flatten_read_groups('planeID', plane._id, plane.meta_read_groups))
+        plane_data_groups.extend(flatten_read_groups('planeID', plane._id, plane.data_read_groups))
+        for artifact in plane.artifacts.values():
+            artifacts, parts, chunks = flatten_artifact(artifact, plane._id)
+            artifact_items.append(artifacts)
+            part_items.extend(parts)
+            chunk_items.extend(chunks)
+
+    return field_items, plane_items, artifact_items, part_items, chunk_items, flatten_members(obs), input_items, \
+        flatten_read_groups('obsID', obs._id, obs.meta_read_groups), plane_meta_groups, plane_data_groups
+
+
+def join_uris(uris: Any) -> str:
+    """Member or input URIs as a single value, as the caom2 TAP columns of the same name
+
+    They are sorted as sets have no order.
+    """
+
+    return ' | '.join(sorted(uri.uri for uri in uris))
+
+
+def flatten_members(obs: Observation) -> list:
+    """Link fields of the members of a composite/derived observation"""
+
+    # Simple observations have no members attribute
+    members = getattr(obs, 'members', None) or ()
+    return [{'obsID': obs._id, 'memberURI': member.uri} for member in members]
+
+
+def flatten_read_groups(id_field: str, entity_id: Any, groups: Any) -> list:
+    """Link fields of the read groups of an observation or plane"""
+
+    return [{id_field: entity_id, 'groupURI': group} for group in groups or ()]
+
+
+def flatten_inputs(plane: Plane) -> list:
+    """Link fields of the provenance inputs of a plane"""
+
+    if plane.provenance is None:
+        return []
+    return [{'planeID': plane._id, 'inputURI': plane_uri.uri} for plane_uri in plane.provenance.inputs]
+
+
+def flatten_plane(plane: Plane, collection: str, observation_id: str, observation_uri: str) -> dict:
+    """Flatten a plane into a plain field dictionary"""
+
+    field_items = flatten_fields(plane)
+
+    # Set some extra, required fields
+    field_items['planeURI'] = f"caom:{collection}/{observation_id}/{plane.product_id}"
+    field_items['obsID'] = observation_uri
+    if plane.provenance is not None and plane.provenance.inputs:
+        field_items['provenance_inputs'] = join_uris(plane.provenance.inputs)
+
+    return field_items
+
+
+def flatten_artifact(artifact: Artifact, plane_id: str) -> tuple:
+    """Flatten an artifact into plain field dictionaries for it and lists of those of its parts and chunks"""
+
+    field_items = flatten_fields(artifact)
+    field_items['planeID'] = plane_id
+
+    part_items, chunk_items = [], []
+    for part in artifact.parts.values():
+        part_items.append(flatten_part(part, artifact._id))
+        chunk_items.extend(flatten_chunk(chunk, part._id) for chunk in part.chunks)
+
+    return field_items, part_items, chunk_items
+
+
+def flatten_part(part: Part, artifact_id: str) -> dict:
+    """Flatten a part into a plain field dictionary"""
+
+    field_items = flatten_fields(part)
+    field_items['artifactID'] = artifact_id
+
+    return field_items
+
+
+def flatten_chunk(chunk: Chunk, part_id: str) -> dict:
+    """Flatten a chunk, including its WCS, into a plain field dictionary"""
+
+    field_items = flatten_fields(chunk, WCS_FIELDS, WCS_TYPES)
+    field_items['partID'] = part_id
+
+    return field_items
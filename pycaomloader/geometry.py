@@ -0,0 +1,223 @@
+"""Storage of position, energy and time bounds and indexed overlap conditions
+
+Shapes are stored as text (DALI style, eg "polygon 10.1 -2.0 10.2 -2.0 ...", intervals
+as "lower upper") together with plain numeric columns that can be indexed: a bounding
+box for positions and lower/upper values for intervals.
+
+These numeric columns are indexed natively by each database:
+PostgreSQL with GiST indexes on box expressions and SQLite with R*Tree virtual tables
+that are kept up to date by triggers (see schema.py). cone_condition and
+interval_condition build conditions on planes that make use of them.
+"""
+
+import math
+from typing import Any
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, or_, select, func, literal_column
+from caom2.shape import Polygon, MultiPolygon, Circle, Interval, SegmentType
+from pycaomloader.schema import CaomPlane
+
+# R*Tree virtual tables, created by schema.py on SQLite only so not part of Base.metadata
+rtree_metadata = MetaData(schema="caom2")
+position_rtree = Table('Plane_position_rtree', rtree_metadata,
+                       Column('id', Integer), Column('ra_min', Float), Column('ra_max', Float),
+                       Column('dec_min', Float), Column('dec_max', Float))
+energy_rtree = Table('Plane_energy_rtree', rtree_metadata,
+                     Column('id', Integer), Column('lower', Float), Column('upper', Float))
+time_rtree = Table('Plane_time_rtree', rtree_metadata,
+                   Column('id', Integer), Column('lower', Float), Column('upper', Float))
+INTERVAL_RTREES = {'energy': energy_rtree, 'time': time_rtree}
+
+
+def cone_box(ra: float, dec: float, radius: float) -> tuple:
+    """Bounding box (ra_min, ra_max, dec_min, dec_max) of a cone, in degrees
+
+    RA limits may fall outside [0, 360) when the cone crosses RA=0.
+    Cones including a pole cover all RAs.
+    """
+
+    dec_min, dec_max = dec - radius, dec + radius
+    if dec_min <= -90 or dec_max >= 90:
+        return 0., 360., max(dec_min, -90.), min(dec_max, 90.)
+
+    ratio = math.sin(math.radians(radius)) / math.cos(math.radians(dec))
+    dra = 180. if ratio >= 1 else math.degrees(math.asin(ratio))
+    return ra - dra, ra + dra, dec_min, dec_max
+
+
+def ra_ranges(ra_min: float, ra_max: float) -> list:
+    """Split RA limits crossing RA=0 into ranges within [0, 360]"""
+
+    if ra_max - ra_min >= 360:
+        return [(0., 360.)]
+    if ra_min < 0:
+        return [(ra_min + 360, 360.), (0., ra_max)]
+    if ra_max > 360:
+        return [(ra_min, 360.), (0., ra_max - 360)]
+    return [(ra_min, ra_max)]
+
+
+def angular_separation(ra1: float, dec1: float, ra2: float, dec2: float) -> float:
+    """Angle between two positions, in degrees"""
+
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    hav = math.sin((dec2 - dec1) / 2) ** 2 + \
+        math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2
+    return math.degrees(2 * math.asin(min(1., math.sqrt(hav))))
+
+
+def points_center(points: list) -> tuple:
+    """Mean position of points, in degrees"""
+
+    x = y = z = 0.
+    for p in points:
+        ra, dec = math.radians(p.cval1), math.radians(p.cval2)
+        x += math.cos(dec) * math.cos(ra)
+        y += math.cos(dec) * math.sin(ra)
+        z += math.sin(dec)
+
+    return math.degrees(math.atan2(y, x)) % 360, math.degrees(math.atan2(z, math.hypot(x, y)))
+
+
+def points_box(points: list) -> tuple:
+    """Bounding box (ra_min, ra_max, dec_min, dec_max) of the vertices of a polygon
+
+    Polygons spanning more than 180 degrees in RA are taken to cross RA=0 and cover all RAs.
+    """
+
+    ras = [p.cval1 for p in points]
+    decs = [p.cval2 for p in points]
+    ra_min, ra_max = min(ras), max(ras)
+    if ra_max - ra_min > 180:
+        ra_min, ra_max = 0., 360.
+
+    return ra_min, ra_max, min(decs), max(decs)
+
+
+def _store_box(field_items: dict, k: str, box: tuple):
+    ra_min, ra_max, dec_min, dec_max = box
+    if ra_min < 0 or ra_max > 360:
+        ra_min, ra_max = 0., 360.
+    field_items[k + '_ra_min'] = ra_min
+    field_items[k + '_ra_max'] = ra_max
+    field_items[k + '_dec_min'] = dec_min
+    field_items[k + '_dec_max'] = dec_max
+
+
+def multipolygon_text(samples: MultiPolygon) -> str:
+    """Text of the polygons of a multipolygon, separated by |"""
+
+    polygons, coords = [], []
+    for v in samples.vertices:
+        if v.type == SegmentType.CLOSE:
+            polygons.append('polygon ' + ' '.join(coords))
+            coords = []
+        else:
+            coords.append(f'{v.cval1} {v.cval2}')
+
+    return ' | '.join(polygons) or None
+
+
+def polygon_fields(field_items: dict, k: str, polygon: Polygon):
+    """Store a polygon as text, with its samples, size and bounding box"""
+
+    field_items[k] = 'polygon ' + ' '.join(f'{p.cval1} {p.cval2}' for p in polygon.points)
+    field_items[k + '_samples'] = None if polygon.samples is None else multipolygon_text(polygon.samples)
+
+    ra, dec = points_center(polygon.points)
+    field_items[k + '_size'] = 2 * max(angular_separation(ra, dec, p.cval1, p.cval2) for p in polygon.points)
+    _store_box(field_items, k, points_box(polygon.points))
+
+
+def circle_fields(field_items: dict, k: str, circle: Circle):
+    """Store a circle as text, with its size and bounding box"""
+
+    center = circle.center
+    field_items[k] = f'circle {center.cval1} {center.cval2} {circle.radius}'
+    field_items[k + '_size'] = 2 * circle.radius
+    _store_box(field_items, k, cone_box(center.cval1, center.cval2, circle.radius))
+
+
+def interval_fields(field_items: dict, k: str, interval: Interval):
+    """Store an interval as text, with its samples, limits and width"""
+
+    field_items[k] = f'{interval.lower} {interval.upper}'
+    field_items[k + '_lower'] = interval.lower
+    field_items[k + '_upper'] = interval.upper
+    field_items[k + '_width'] = interval.upper - interval.lower
+    if interval.samples:
+        field_items[k + '_samples'] = ' | '.join(f'{s.lower} {s.upper}' for s in interval.samples)
+
+
+# How bounds of each shape type are stored
+BOUNDS_HANDLERS = {Polygon: polygon_fields,
+                   Circle: circle_fields,
+                   Interval: interval_fields}
+
+
+# Inline rather than bound, so interval boxes match the expressions of the GiST indexes
+ZERO = literal_column('0.0')
+
+
+def _box(ra_min: Any, ra_max: Any, dec_min: Any, dec_max: Any):
+    return func.box(func.point(ra_min, dec_min), func.point(ra_max, dec_max))
+
+
+def position_box():
+    """PostgreSQL box of the plane position bounding box, as indexed in schema.py"""
+
+    c = CaomPlane.__table__.c
+    return _box(c.position_bounds_ra_min, c.position_bounds_ra_max,
+                c.position_bounds_dec_min, c.position_bounds_dec_max)
+
+
+def interval_box(prefix: str):
+    """PostgreSQL box of a plane interval, eg energy_bounds, as indexed in schema.py"""
+
+    c = CaomPlane.__table__.c
+    lower, upper = c[f'{prefix}_bounds_lower'], c[f'{prefix}_bounds_upper']
+    return _box(lower, upper, ZERO, ZERO)
+
+
+def cone_condition(dialect: str, ra: float, dec: float, radius: float):
+    """Condition selecting planes whose position bounding box overlaps a cone
+
+    This is a fast, index-backed candidate search: shapes near the cone but outside it
+    may be included.
+    """
+
+    ra_min, ra_max, dec_min, dec_max = cone_box(ra, dec, radius)
+    ranges = ra_ranges(ra_min, ra_max)
+
+    if dialect == 'postgresql':
+        box = position_box()
+        return or_(*(box.op('&&')(_box(lo, hi, dec_min, dec_max)) for lo, hi in ranges))
+
+    c = CaomPlane.__table__.c
+    exact = and_(c.position_bounds_dec_max >= dec_min, c.position_bounds_dec_min <= dec_max,
+                 or_(*(and_(c.position_bounds_ra_max >= lo, c.position_bounds_ra_min <= hi) for lo, hi in ranges)))
+
+    if dialect == 'sqlite':
+        # The R*Tree stores 32 bit floats rounded outwards, so its candidates are checked exactly
+        r = position_rtree.c
+        return and_(literal_column('"Plane".rowid').in_(
+            select(r.id).where(r.dec_max >= dec_min, r.dec_min <= dec_max,
+                               or_(*(and_(r.ra_max >= lo, r.ra_min <= hi) for lo, hi in ranges)))), exact)
+
+    return exact
+
+
+def interval_condition(dialect: str, prefix: str, lower: float, upper: float):
+    """Condition selecting planes whose energy or time bounds overlap [lower, upper]"""
+
+    if dialect == 'postgresql':
+        return interval_box(prefix).op('&&')(_box(lower, upper, ZERO, ZERO))
+
+    c = CaomPlane.__table__.c
+    exact = and_(c[f'{prefix}_bounds_upper'] >= lower, c[f'{prefix}_bounds_lower'] <= upper)
+
+    if dialect == 'sqlite':
+        r = INTERVAL_RTREES[prefix].c
+        return and_(literal_column('"Plane".rowid').in_(select(r.id).where(r.upper >= lower, r.lower <= upper)),
+                    exact)
+
+    return exact
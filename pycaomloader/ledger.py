@@ -0,0 +1,104 @@
+"""Ingest progress ledger for crash-safe, resumable loads
+
+Every source file gets a row in the IngestLedger table with its path, size, mtime,
+content hash and status. Rows of committed files are written in the same transaction
+as their data, so after a crash the ledger matches what was actually loaded.
+
+Resuming skips the files already committed, unless their size or mtime changed, or for
+(name, xml content) pairs such as archive members, their size or content hash. They are
+looked up chunk_size at a time with one IN query on the ledger primary key.
+"""
+
+import os
+import hashlib
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Union
+from sqlalchemy import Connection, Engine, select
+from pycaomloader.schema import IngestLedger
+from pycaomloader.stats import IngestStats
+
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+
+def source_name(source: Union[str, tuple]) -> str:
+    """Ledger path of a file name or (name, xml content) pair"""
+
+    return source[0] if isinstance(source, tuple) else str(source)
+
+
+def read_source(source: Union[str, tuple]) -> tuple:
+    """Read a source once, returning it as a (name, xml content) pair and its ledger fields"""
+
+    if isinstance(source, tuple):
+        name, content = source
+        mtime = None
+    else:
+        name = source
+        with open(source, 'rb') as f:
+            content = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+
+    info = {'path': name,
+            'size': len(content),
+            'mtime': mtime,
+            'hash': hashlib.sha256(content).hexdigest()}
+    return (name, content), info
+
+
+def ledger_row(info: dict, status: str, obs_id: Optional[str] = None, error: Optional[str] = None) -> dict:
+    """Ledger row, keyed by column, for the fields of a source"""
+
+    return dict(info, status=status, obsID=obs_id, error=error, ingested=datetime.now())
+
+
+def _unchanged(source: Union[str, tuple],
+               size: Optional[int],
+               mtime: Optional[float],
+               digest: Optional[str]) -> bool:
+    if isinstance(source, tuple):
+        # The content is already in memory, hashing it is cheap next to parsing it again
+        return len(source[1]) == size and hashlib.sha256(source[1]).hexdigest() == digest
+    try:
+        stat = os.stat(source)
+    except (OSError, TypeError):
+        # Not a local file, eg a key fetched from object storage, nothing to compare
+        return True
+    return stat.st_size == size and stat.st_mtime == mtime
+
+
+def committed_files(conn: Connection, names: list) -> dict:
+    """Size, mtime and hash of the files among names committed according to the ledger, by path"""
+
+    table = IngestLedger.__table__
+    return {path: (size, mtime, digest) for path, size, mtime, digest in conn.execute(
+        select(table.c.path, table.c.size, table.c.mtime, table.c.hash).where(
+            table.c.path.in_(names), table.c.status == COMMITTED))}
+
+
+def remaining(sources: list, done: dict, stats: Optional[IngestStats] = None) -> list:
+    """Sources not committed, or changed since, given the committed_files among them"""
+
+    pending = []
+    for source in sources:
+        name = source_name(source)
+        if name in done and _unchanged(source, *done[name]):
+            if stats is not None:
+                stats.count('skipped')
+        else:
+            pending.append(source)
+    return pending
+
+
+def skip_completed(engine: Engine,
+                   sources: Iterable[Union[str, tuple]],
+                   chunk_size: int = 1000,
+                   stats: Optional[IngestStats] = None) -> Iterator[Union[str, tuple]]:
+    """Drop the sources committed according to the ledger, unless they changed since"""
+
+    sources = iter(sources)
+    while chunk := list(islice(sources, chunk_size)):
+        with engine.connect() as conn:
+            done = committed_files(conn, [source_name(s) for s in chunk])
+        yield from remaining(chunk, done, stats)
@@ -2,35 +2,123 @@
 
 # pylint: disable=redefined-outer-name, protected-access, invalid-name
 
+import io
 import os
-from typing import Any
-from datetime import datetime
-from sqlalchemy import create_engine, text, Engine, DDL, event
+import zlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Optional, Union
+from sqlalchemy import create_engine, Engine, QueuePool, StaticPool, DDL, Table, event, insert, select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.orm import Session
 from caom2.observation import Observation
-from caom2.plane import Plane, Position, Time, Energy, Metrics, Polarization, CustomAxis
+from caom2.plane import Plane
 from caom2.artifact import Artifact
-from caom2.shape import Point, Circle, Polygon, Interval
 from caom2.obs_reader_writer import ObservationReader
 from sqlalchemy_utils.functions import database_exists, create_database
-from pycaomloader.schema import Base, CaomObservation, CaomPlane
+from pycaomloader.schema import Base, CaomObservation, CaomPlane, CaomArtifact, CaomPart, CaomChunk, \
+    CaomObservationMember, CaomProvenanceInput, CaomObservationMetaReadGroup, CaomPlaneMetaReadGroup, \
+    CaomPlaneDataReadGroup, IngestLedger
+from pycaomloader.flatten import flatten_observation, flatten_plane, flatten_artifact
+from pycaomloader.ledger import COMMITTED, FAILED, ledger_row, read_source, skip_completed, source_name
+from pycaomloader.pgcopy import copy_rows
+from pycaomloader.sources import iter_sources
+from pycaomloader.stats import IngestStats
 
+logger = logging.getLogger(__name__)
 
-def load_engine(connection_string: str) -> Engine:
-    """Create SQLAlchemy engine"""
+# Tables written for each observation, in the order of the field dictionaries
+# returned by flatten_observation and of the rows of to_rows, parents before children
+MODELS = (CaomObservation, CaomPlane, CaomArtifact, CaomPart, CaomChunk, CaomObservationMember, CaomProvenanceInput,
+          CaomObservationMetaReadGroup, CaomPlaneMetaReadGroup, CaomPlaneDataReadGroup)
 
-    engine = create_engine(connection_string)
+
+# Observation readers of each thread by validation mode, see observation_reader
+_READERS = threading.local()
+
+# Engines by connection string and options, see load_engine
+_ENGINES = {}
+
+# Pragmas set on the attached caom2 database of every SQLite connection, tuned for bulk loads
+SQLITE_PRAGMAS = {'journal_mode': 'WAL',
+                  'synchronous': 'NORMAL',
+                  'cache_size': -64000}
+
+
+def load_engine(connection_string: str,
+                pool_size: int = 5,
+                max_overflow: int = 10,
+                pool_pre_ping: bool = True,
+                pool_recycle: int = 3600,
+                **kwargs) -> Engine:
+    """Create SQLAlchemy engine, or return the one already created for these arguments
+
+    Other keyword arguments are passed on to create_engine.
+    An in-memory SQLite database (sqlite://) lives as long as its engine, which has a
+    single connection.
+    """
+
+    # repr as values such as connect_args may not be hashable
+    key = (connection_string, pool_size, max_overflow, pool_pre_ping, pool_recycle, repr(sorted(kwargs.items())))
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+
+    kwargs.update(pool_pre_ping=pool_pre_ping)
 
     # Special handling for sqlite
-    if 'sqlite' in connection_string:
-        engine = create_engine('sqlite://')
-        conn = engine.connect()
-        db_name = connection_string.replace('sqlite://', '')
-        conn.execute(text(f"ATTACH DATABASE '{db_name[1:]}' as 'caom2'"))
+    # The file is attached as the caom2 schema of an in-memory database, on every pooled connection
+    url = make_url(connection_string)
+    if url.get_backend_name() == 'sqlite':
+        kwargs['connect_args'] = {'check_same_thread': False, **kwargs.get('connect_args', {})}
+        if sqlite_in_memory(url):
+            # The attached database is private to its connection, which must not be recycled
+            engine = create_engine('sqlite://', poolclass=StaticPool, **kwargs)
+        else:
+            engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                                   pool_recycle=pool_recycle, **kwargs)
+        attach_sqlite(engine, url.database or '')
+    else:
+        engine = create_engine(connection_string, pool_size=pool_size, max_overflow=max_overflow,
+                               pool_recycle=pool_recycle, **kwargs)
 
+    _ENGINES[key] = engine
     return engine
 
 
+def sqlite_in_memory(url: URL) -> bool:
+    """Whether a SQLite URL is of an in-memory database"""
+
+    return url.database in (None, '', ':memory:')
+
+
+def attach_sqlite(engine: Engine, db_name: str, pragmas: Optional[dict] = None):
+    """Attach a SQLite file as the caom2 schema of every new connection of an engine"""
+
+    if pragmas is None:
+        pragmas = SQLITE_PRAGMAS
+
+    @event.listens_for(engine, 'connect')
+    def attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE '{db_name}' as 'caom2'")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA caom2.{name}={value}")
+        cursor.close()
+
+
+def dispose_engines():
+    """Close the connections of all cached engines and forget them"""
+
+    for engine in _ENGINES.values():
+        engine.dispose()
+    _ENGINES.clear()
+
+
 def prepare_database(connection_string: str,
                     drop_tables: bool = False
                     ):
@@ -49,171 +137,585 @@ def prepare_database(connection_string: str,
         base.metadata.drop_all(bind=engine)
 
     # Logic for ensuring caom2 schema exists first (not applicable for sqlite)
-    if 'sqlite' not in connection_string:
-        event.listen(Base.metadata, 'before_create', DDL("CREATE SCHEMA IF NOT EXISTS caom2"))
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            conn.execute(DDL("CREATE SCHEMA IF NOT EXISTS caom2"))
     base.metadata.create_all(engine)
 
 
-def store_items(field_items: dict, k: str, v: Any):
-    """Helper function to get sub items from CAOM"""
+def ingest_observation(file_name: str, 
+                       connection_string: str,
+                       ledger: bool = False,
+                       validate: Union[bool, float] = False):
+    """Ingest an observation from an xml file, recording it in the ingest ledger if ledger"""
 
-    # print(k, v, type(v))
+    # CAOM object
+    source = file_name
+    if ledger:
+        source, info = read_source(file_name)
+    obs = read_observation(source, validate)
 
-    # Exit early if None
-    if v is None:
-        field_items[k] = v
-        return
-    
-    # Loop over child attributes to set them
-    for k2, v2 in vars(v).items():
-        # print(k, k2, v2, type(v2))
-        if k2.endswith('points') or k2.endswith('samples'):
-            # TODO: Figure out how to implement these
-            continue
-        elif isinstance(v2, (Point, Circle, Polygon, Interval, Position, Time, \
-                           Energy, Metrics, Polarization, CustomAxis)) \
-                            or k2.endswith('bounds'):
-            # Recursive check to drill down into members
-            store_items(field_items, k+k2, v2)
-        elif isinstance(v2, (str, int, float, type(None), bool, datetime)):
-            field_items[k+k2] = v2
-        elif isinstance(v2, (set, list)):
-            temp = ' | '.join([x for x in v2])
-            if temp.strip() != '':
-                # Don't store empty strings
-                field_items[k+k2] = temp
-
-
-def special_handling(field_items: dict, k: str, v: Any):
-    """Special handling of certain fields"""
-
-    if k in ('target', 'targetPosition', 'proposal', 'telescope', 'environment', 'instrument', \
-             'provenance', 'position', 'time', 'energy', 'metrics', 'polarization', 'custom') \
-            and v is not None:
-        store_items(field_items, k, v)
-    elif k in ('intent') and v is not None:
-        # SQL validation not properly capturing just the value so have to set it here
-        field_items[k] = v.value
-    elif k in ('planes', 'artifacts'):
-        # Handled separately
-        return
-    elif k == 'members':
-        # TODO: Figure out how to handle members
-        return
-    elif k.endswith('read_groups'):
-        # TODO: Figure out how to handle read groups
+    # Prepare database objects
+    db_objects = process_observation(obs)
+
+    # Ingest into data
+    engine = load_engine(connection_string)
+    with Session(engine) as session:
+        session.add_all(db_objects)
+        if ledger:
+            write_ledger(session, [ledger_row(info, COMMITTED, obs._id)])
+        session.commit()
+
+
+def ingest_files(paths: Iterable[Union[str, tuple]],
+                 connection_string: str,
+                 batch_size: int = 500,
+                 workers: int = 1,
+                 queue_size: Optional[int] = None,
+                 backend: str = 'orm',
+                 incremental: bool = False,
+                 ledger: bool = False,
+                 resume: bool = False,
+                 validate: Union[bool, float] = False,
+                 stats: Optional[IngestStats] = None) -> dict:
+    """Ingest many observation xml files sharing one engine and committing in batches
+
+    With workers > 1 the xml files are parsed and flattened in a pool of worker
+    processes while this process remains the single database writer.
+    The backend selects how rows are written, see WRITERS.
+    In incremental mode observations whose accMetaChecksum is unchanged are skipped
+    and the rest are upserted, whatever the backend.
+    With ledger, every file is recorded in the IngestLedger table with its data,
+    and resume (which implies ledger) skips the files already committed, see ledger.py.
+    validate turns on XSD validation of all or a fraction of the files, see read_observation.
+    Stage timings and counters are collected in stats, if given.
+    """
+
+    if backend not in WRITERS:
+        raise ValueError(f'Unknown backend {backend}, expected one of {list(WRITERS)}')
+    if incremental:
+        backend = 'upsert'
+    if stats is None:
+        stats = IngestStats()
+
+    engine = load_engine(connection_string)
+    if backend == 'copy' and engine.dialect.name != 'postgresql':
+        raise ValueError('The copy backend requires a PostgreSQL database')
+    if resume:
+        ledger = True
+        paths = skip_completed(engine, paths, stats=stats)
+
+    with Session(engine) as session:
+        batch = []
+        for file_name, items, error, info in parse_files(paths, workers=workers, queue_size=queue_size,
+                                                         ledger=ledger, validate=validate, stats=stats):
+            if error is not None:
+                logger.warning('Failed to process %s: %s', file_name, error)
+                stats.count('failed')
+                if info is not None:
+                    record_failure(session, info, error)
+                continue
+
+            batch.append((file_name, items, info))
+            if len(batch) >= batch_size:
+                write_batch(session, batch, backend, incremental, stats)
+                batch = []
+
+        if batch:
+            write_batch(session, batch, backend, incremental, stats)
+
+    return ingest_summary(stats)
+
+
+def ingest_summary(stats: IngestStats) -> dict:
+    """Log and return the file counts and rate of an ingest run"""
+
+    elapsed = stats.elapsed
+    counts = stats.counters
+    summary = {'files': counts['files'],
+               'failed': counts['failed'],
+               'skipped': counts['skipped'],
+               'seconds': elapsed,
+               'files_per_sec': counts['files'] / elapsed if elapsed > 0 else 0.}
+    logger.info('Ingested %d files (%d failed, %d unchanged) in %.2f s (%.1f files/s)',
+                counts['files'], counts['failed'], counts['skipped'], elapsed, summary['files_per_sec'])
+    stats.log(logging.DEBUG)
+
+    return summary
+
+
+def write_batch(session: Session, batch: list, backend: str, incremental: bool, stats: IngestStats):
+    """Write one batch, updating the files/failed/skipped counts"""
+
+    if incremental:
+        n_total = len(batch)
+        with stats.stage('lookup'):
+            changed = filter_unchanged(session, batch)
+        stats.count('skipped', n_total - len(changed))
+
+        # Unchanged observations are already loaded, their files are complete
+        changed_ids = set(map(id, changed))
+        rows = ledger_rows([entry for entry in batch if id(entry) not in changed_ids])
+        if rows:
+            write_ledger(session, rows)
+            session.commit()
+
+        batch = changed
+        if not batch:
+            return
+
+    n_ok = commit_batch(session, batch, backend=backend, stats=stats)
+    stats.count('files', n_ok)
+    stats.count('failed', len(batch) - n_ok)
+
+
+def ingest_directory(path: str,
+                     connection_string: str,
+                     **kwargs) -> dict:
+    """Ingest all observation xml files found under a directory
+
+    Keyword arguments are passed on to ingest_files.
+    """
+
+    return ingest_files(find_xml_files(path), connection_string, **kwargs)
+
+
+def ingest_archive(source: Union[str, os.PathLike, Any],
+                   connection_string: str,
+                   **kwargs) -> dict:
+    """Ingest the observations of a tar/zip archive, compressed or concatenated xml, or stream
+
+    The source is read in a single sequential pass without extracting it to disk.
+    Keyword arguments are passed on to ingest_files.
+    """
+
+    return ingest_files(iter_sources(source), connection_string, **kwargs)
+
+
+def find_xml_files(path: str) -> Iterator[str]:
+    """Walk a directory and yield the xml files in it"""
+
+    for root, _, files in os.walk(path):
+        for f in sorted(files):
+            if f.endswith('.xml'):
+                yield os.path.join(root, f)
+
+
+def observation_reader(validate: bool = False) -> ObservationReader:
+    """Observation reader of the current thread, created once so a compiled XSD schema is reused
+
+    Readers keep state about the document being read so they are not shared between threads.
+    """
+
+    readers = _READERS.__dict__
+    reader = readers.get(validate)
+    if reader is None:
+        reader = readers[validate] = ObservationReader(validate=validate)
+    return reader
+
+
+def should_validate(name: str, validate: Union[bool, float]) -> bool:
+    """Whether to validate a source against the CAOM XSD: always, never, or for a
+    fraction validate of the sources, picked by name so the choice is repeatable
+    """
+
+    if isinstance(validate, bool):
+        return validate
+    return zlib.crc32(name.encode()) % 10000 < validate * 10000
+
+
+def read_observation(source: Union[str, tuple], validate: Union[bool, float] = False) -> Observation:
+    """Read an observation from an xml file or a (name, xml content) pair
+
+    validate is True, False (the default, for trusted sources) or the fraction of the
+    sources to validate, see should_validate.
+    """
+
+    reader = observation_reader(should_validate(source_name(source), validate))
+    if isinstance(source, tuple):
+        source = io.BytesIO(source[1])
+
+    return reader.read(source=source)
+
+
+def parse_file(source: Union[str, tuple],
+               stats: Optional[IngestStats] = None,
+               validate: Union[bool, float] = False) -> tuple:
+    """Read an xml file, or a (name, xml content) pair, and flatten it into rows, see to_rows"""
+
+    if stats is None:
+        return to_rows(flatten_observation(read_observation(source, validate)))
+
+    stats.count('bytes', len(source[1]) if isinstance(source, tuple) else os.path.getsize(source))
+    with stats.stage('parse'):
+        obs = read_observation(source, validate)
+    with stats.stage('flatten'):
+        return to_rows(flatten_observation(obs))
+
+
+def _parse_worker(source: Union[str, tuple], ledger: bool = False, validate: Union[bool, float] = False) -> tuple:
+    """Parse a file, returning the error message instead of raising so it can cross processes
+
+    The stage timings are returned as a plain dictionary to be merged by the writer,
+    followed by the ledger fields of the file (None unless ledger).
+    """
+
+    file_name = source_name(source)
+    stats = IngestStats()
+    info = None
+    try:
+        if ledger:
+            # Read once for both the content hash and the parser
+            source, info = read_source(source)
+        return file_name, parse_file(source, stats, validate), None, stats.to_dict(), info
+    except Exception as e:  # pylint: disable=broad-except
+        return file_name, None, str(e), stats.to_dict(), info
+
+
+def parse_files(paths: Iterable[Union[str, tuple]],
+                workers: int = 1,
+                queue_size: Optional[int] = None,
+                ledger: bool = False,
+                validate: Union[bool, float] = False,
+                stats: Optional[IngestStats] = None) -> Iterator[tuple]:
+    """Parse xml files in order, yielding (file name, observation rows, error, ledger fields) tuples
+
+    Each entry of paths is a file name or a (name, xml content) pair as produced by
+    sources.iter_sources. The ledger fields are None unless ledger, see ledger.read_source.
+    validate selects XSD validation, see read_observation.
+
+    When using worker processes at most queue_size files are in flight at once so
+    memory stays flat if the consumer (the database writer) is slower than the parsers.
+    """
+
+    if stats is None:
+        stats = IngestStats()
+
+    if workers <= 1:
+        for file_name in paths:
+            file_name, items, error, measured, info = _parse_worker(file_name, ledger, validate)
+            stats.merge(measured)
+            yield file_name, items, error, info
         return
-    elif 'checksum' in k.lower() or 'uri' in k.lower():
-        # Handle checksum/uri fields
-        field_items[k] = v.uri
+
+    if queue_size is None:
+        queue_size = 4 * workers
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for file_name in paths:
+            pending.append(pool.submit(_parse_worker, file_name, ledger, validate))
+            if len(pending) >= queue_size:
+                file_name, items, error, measured, info = pending.popleft().result()
+                stats.merge(measured)
+                yield file_name, items, error, info
+
+        while pending:
+            file_name, items, error, measured, info = pending.popleft().result()
+            stats.merge(measured)
+            yield file_name, items, error, info
+
+
+def write_orm(session: Session, items_list: list):
+    """Add ORM objects built from observation rows to the session"""
+
+    for items in items_list:
+        session.add_all(build_objects(*items))
+
+
+def write_core(session: Session, items_list: list):
+    """Insert observation rows with Core executemany statements, bypassing the ORM unit of work
+
+    Each table gets a single statement for the whole batch, which SQLAlchemy sends
+    through its insertmanyvalues support where the driver allows it.
+    """
+
+    for index, model in enumerate(MODELS):
+        rows = row_dicts(model, model_rows(items_list, index))
+        if rows:
+            session.execute(insert(model.__table__), rows)
+
+
+def write_copy(session: Session, items_list: list):
+    """Stream observation rows into PostgreSQL with COPY FROM STDIN, one COPY per table"""
+
+    # The raw driver cursor shares the session transaction
+    cursor = session.connection().connection.cursor()
+    for index, model in enumerate(MODELS):
+        copy_rows(cursor, model.__table__, model_rows(items_list, index))
+
+
+def upsert_statement(session: Session, table: Table):
+    """Dialect specific INSERT ... ON CONFLICT DO UPDATE statement for a table"""
+
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(table)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
     else:
-        field_items[k] = v
+        raise ValueError(f'Upserts are not supported for {dialect}')
 
+    return stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key],
+        set_={c.name: stmt.excluded[c.key] for c in table.columns if not c.primary_key})
 
-def rename_fields(k: str) -> str:
-    """Helper function to rename some fields"""
 
-    if k=='target_position':
-        k = 'targetPosition'
+def write_upsert(session: Session, items_list: list):
+    """Insert or update observation rows, replacing their planes, artifacts, parts, chunks and links
 
-    return k
+    Replacing the children removes those the observations no longer have.
+    """
 
+    obs_rows = row_dicts(CaomObservation, model_rows(items_list, 0))
+    session.execute(upsert_statement(session, CaomObservation.__table__), obs_rows)
 
-def ingest_observation(file_name: str, 
-                       connection_string: str):
-    """Ingest an observation from an xml file"""
+    obs_ids = [row['obsID'] for row in obs_rows]
+    for model in reversed(MODELS[1:]):
+        session.execute(delete(model.__table__).where(owned_by(model.__table__, obs_ids)))
+    for index, model in enumerate(MODELS[1:], 1):
+        rows = row_dicts(model, model_rows(items_list, index))
+        if rows:
+            session.execute(insert(model.__table__), rows)
 
-    # CAOM object
-    obs = ObservationReader().read(source=file_name)
 
-    # Prepare database objects
-    db_objects = process_observation(obs)
+def owned_by(table: Table, obs_ids: list):
+    """Condition selecting the rows of a child table that belong to some observations
 
-    # Ingest into data
-    engine = load_engine(connection_string)
-    with Session(engine) as session:
-        session.add_all(db_objects)
+    The table's foreign key is followed up to the Observation table through subqueries.
+    """
+
+    fk = next(iter(table.foreign_keys))
+    parent = fk.column.table
+    if parent is CaomObservation.__table__:
+        return fk.parent.in_(obs_ids)
+
+    return fk.parent.in_(select(fk.column).where(owned_by(parent, obs_ids)))
+
+
+# Available ways of writing a batch of observation rows
+WRITERS = {'orm': write_orm,
+           'core': write_core,
+           'copy': write_copy,
+           'upsert': write_upsert}
+
+
+@lru_cache(maxsize=None)
+def column_map(model: type) -> dict:
+    """Map the ORM attribute names of a model to its table column keys"""
+
+    return {attr.key: attr.columns[0].key for attr in model.__mapper__.column_attrs}
+
+
+@lru_cache(maxsize=None)
+def row_columns(model: type) -> tuple:
+    """Column keys of the table of a model, in metadata order, ie the order of its row tuples"""
+
+    return tuple(c.key for c in model.__table__.columns)
+
+
+@lru_cache(maxsize=None)
+def row_attributes(model: type) -> tuple:
+    """ORM attribute names of a model in the order of its row tuples"""
+
+    mapper = model.__mapper__
+    return tuple(mapper.get_property_by_column(c).key for c in model.__table__.columns)
+
+
+def to_row(model: type, field_items: dict) -> tuple:
+    """Convert flattened fields to a complete row tuple, in table column order"""
+
+    # Every row has every column so they can share one executemany statement
+    return tuple(map(field_items.get, row_attributes(model)))
+
+
+def to_rows(items: tuple) -> tuple:
+    """Convert flattened observation fields to rows: the observation row followed by
+    one list of rows per child table, in the order of MODELS
+
+    Rows are plain tuples, much lighter than dictionaries or ORM objects when batching
+    or sending observations between processes.
+    """
+
+    obs_items, *child_items = items
+    return (to_row(CaomObservation, obs_items),
+            *([to_row(model, field_items) for field_items in items_list]
+              for model, items_list in zip(MODELS[1:], child_items)))
+
+
+def row_dicts(model: type, rows: Iterable[tuple]) -> list:
+    """Parameters of an executemany statement, keyed by column, for row tuples"""
+
+    columns = row_columns(model)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def model_rows(items_list: list, index: int) -> Iterator[tuple]:
+    """Rows of the table MODELS[index] across a batch of observation rows"""
+
+    for items in items_list:
+        if index == 0:
+            yield items[0]
+        else:
+            yield from items[index]
+
+
+def filter_unchanged(session: Session, batch: list) -> list:
+    """Drop observations whose accMetaChecksum matches the one already loaded"""
+
+    table = CaomObservation.__table__
+    columns = row_columns(CaomObservation)
+    i_id, i_checksum = columns.index('obsID'), columns.index('accMetaChecksum')
+    ids = [entry[1][0][i_id] for entry in batch]
+    loaded = dict(session.execute(
+        select(table.c.obsID, table.c.accMetaChecksum).where(table.c.obsID.in_(ids))).all())
+
+    changed = []
+    for entry in batch:
+        items = entry[1]
+        checksum = items[0][i_checksum]
+        if checksum is None or loaded.get(items[0][i_id]) != checksum:
+            changed.append(entry)
+
+    return changed
+
+
+def commit_batch(session: Session,
+                 batch: list,
+                 backend: str = 'orm',
+                 stats: Optional[IngestStats] = None) -> int:
+    """Commit a batch of (file name, observation rows, ledger fields) entries, returning the number committed
+
+    The ledger fields may be None, otherwise the files are recorded in the ledger
+    in the same transaction as their data.
+    """
+
+    if stats is None:
+        stats = IngestStats()
+
+    try:
+        write_items(session, [items for _, items, _ in batch], backend, stats, ledger_rows(batch))
+        return len(batch)
+    except Exception:  # pylint: disable=broad-except
+        session.rollback()
+
+    # Fall back to one commit per file to isolate the bad ones
+    n_ok = 0
+    for entry in batch:
+        file_name, items, info = entry
+        try:
+            write_items(session, [items], backend, stats, ledger_rows([entry]))
+            n_ok += 1
+        except Exception as e:  # pylint: disable=broad-except
+            session.rollback()
+            logger.warning('Failed to commit %s: %s', file_name, e)
+            if info is not None:
+                record_failure(session, info, str(e))
+
+    return n_ok
+
+
+def ledger_rows(batch: list) -> list:
+    """Committed ledger rows for the entries of a batch that have ledger fields"""
+
+    i_id = row_columns(CaomObservation).index('obsID')
+    return [ledger_row(info, COMMITTED, items[0][i_id]) for _, items, info in batch if info is not None]
+
+
+def write_ledger(session: Session, rows: list):
+    """Record ledger rows in the session's transaction, replacing those of the same files"""
+
+    if rows:
+        session.execute(upsert_statement(session, IngestLedger.__table__), rows)
+
+
+def record_failure(session: Session, info: dict, error: str):
+    """Record a file that could not be loaded in the ledger, in its own transaction"""
+
+    try:
+        write_ledger(session, [ledger_row(info, FAILED, error=error)])
         session.commit()
+    except Exception as e:  # pylint: disable=broad-except
+        session.rollback()
+        logger.warning('Failed to record %s in the ledger: %s', info['path'], e)
 
 
-def process_observation(obs: Observation) -> list:
-    """Generate database objects for the observation"""
+def write_items(session: Session, items_list: list, backend: str, stats: IngestStats, ledger: list = ()):
+    """Write and commit observation rows, and their ledger rows, timing each step"""
 
-    # Database Objects
-    db_objects = []
-    db_obs = CaomObservation()
-
-    # Loop over attributes of obs
-    field_items = {}
-    for k, v in vars(obs).items():
-        if k == '_planes':
-            # Generate plane database objects
-            for _, plane in v.items():
-                db_plane = process_plane(plane, obs.collection, obs.observation_id, obs._id)
-                db_objects.append(db_plane)
-
-        # strip starting _ for simplicity
-        if k.startswith('_'):
-            k = k[1:]
-        # rename some fields
-        k = rename_fields(k)
-
-        # Special handling
-        special_handling(field_items, k, v)
-
-    # Set the type code based on whether this is Derived or Simple
-    if 'Derived' in obs.__class__.__name__ or 'Composite' in obs.__class__.__name__:
-        db_obs.typeCode = 'D'
-    else:
-        db_obs.typeCode = 'S'
+    with stats.stage('write'):
+        WRITERS[backend](session, items_list)
+        write_ledger(session, ledger)
+    with stats.stage('flush'):
+        session.flush()
+    with stats.stage('commit'):
+        session.commit()
 
-    # Map to schema
-    for k, v in field_items.items():
-        setattr(db_obs, k, v)
+    stats.batch(len(items_list))
+    stats.count('observation_rows', len(items_list))
+    for index, model in enumerate(MODELS[1:], 1):
+        stats.count(f'{model.__tablename__.lower()}_rows', sum(len(items[index]) for items in items_list))
+
+
+def build_objects(obs_row: tuple, plane_rows: list, *child_rows: list) -> list:
+    """Build the database objects from observation, plane, artifact, part, chunk and link rows"""
+
+    db_obs = build_object(CaomObservation, obs_row)
+
+    logger.debug('%s', db_obs)
+    db_objects = [db_obs] + [build_plane(row) for row in plane_rows]
+    for model, rows in zip(MODELS[2:], child_rows):
+        db_objects.extend(build_object(model, row) for row in rows)
 
-    print(db_obs)
-    db_objects.insert(0, db_obs)
     return db_objects
 
 
-def process_plane(plane: Plane, collection: str, observation_id: str, observation_uri: str):
-    """Generate database objects for the plane"""
+def build_plane(row: tuple) -> CaomPlane:
+    """Build the database object for a plane row"""
 
-    db_plane = CaomPlane()
+    db_plane = build_object(CaomPlane, row)
 
-    # Loop over attributes of obs
-    field_items = {}
-    for k, v in vars(plane).items():
-        if k == '_artifacts':
-            # TODO: Implement artifacts later
-            pass
+    logger.debug('%s', db_plane)
+    return db_plane
 
-        # strip starting _ for simplicity
-        if k.startswith('_'):
-            k = k[1:]
 
-        # Special handling
-        special_handling(field_items, k, v)
+def build_object(model: type, row: tuple) -> Base:
+    """Build the database object of a model for a row"""
 
-    # Set some extra, required fields
-    field_items['planeURI'] = f"caom:{collection}/{observation_id}/{plane.product_id}"
-    field_items['obsID'] = observation_uri
+    db_object = model()
 
     # Map to schema
-    for k, v in field_items.items():
-        setattr(db_plane, k, v)
+    for k, v in zip(row_attributes(model), row):
+        setattr(db_object, k, v)
 
-    print(db_plane)
+    return db_object
 
-    return db_plane
 
+def process_observation(obs: Observation) -> list:
+    """Generate database objects for the observation"""
+
+    return build_objects(*to_rows(flatten_observation(obs)))
 
-def process_artifact(artifact: Artifact):
-    pass
+
+def process_plane(plane: Plane, collection: str, observation_id: str, observation_uri: str):
+    """Generate database objects for the plane"""
+
+    return build_plane(to_row(CaomPlane, flatten_plane(plane, collection, observation_id, observation_uri)))
+
+
+def process_artifact(artifact: Artifact, plane_id: str) -> list:
+    """Generate database objects for the artifact and its parts and chunks"""
+
+    artifact_items, part_items, chunk_items = flatten_artifact(artifact, plane_id)
+    return [build_object(CaomArtifact, to_row(CaomArtifact, artifact_items))] + \
+        [build_object(CaomPart, to_row(CaomPart, items)) for items in part_items] + \
+        [build_object(CaomChunk, to_row(CaomChunk, items)) for items in chunk_items]
 
 
 if __name__ == '__main__':  # pylint: disable=invalid-name
 
+    logging.basicConfig(level=logging.INFO)
+
     # connection_string = 'postgresql+psycopg2://localhost:5432/caom'
     connection_string = 'sqlite:///caom.db'
 
@@ -229,7 +731,4 @@ if __name__ == '__main__':  # pylint: disable=invalid-name
     ingest_observation(file_name, connection_string)
 
     # my_path = '../../data/CAOM/pyCAOM2/unittests/data/xml/'
-    # for f in os.listdir(my_path):
-    #     if f.endswith('.xml'):
-    #         print(f'Ingesting {f}')
-    #         ingest_observation(os.path.join(my_path, f), connection_string)
+    # ingest_directory(my_path, connection_string, batch_size=500)
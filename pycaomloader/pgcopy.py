@@ -0,0 +1,76 @@
+"""Bulk loading into PostgreSQL with COPY FROM STDIN"""
+
+import io
+from typing import Any, Iterable
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import Table
+
+# Characters that must be escaped in the COPY text format
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def format_value(v: Any) -> str:
+    """Format a single value for the COPY text format"""
+
+    if v is None:
+        return '\\N'
+    if isinstance(v, bool):
+        return 't' if v else 'f'
+    if isinstance(v, datetime):
+        return v.isoformat(' ')
+    if isinstance(v, (UUID, int, float)):
+        return str(v)
+    return str(v).translate(_ESCAPES)
+
+
+class CopyStream(io.TextIOBase):
+    """Read-only file-like object producing COPY text lines from rows on demand
+
+    This keeps only a small buffer in memory instead of the whole batch.
+    """
+
+    def __init__(self, rows: Iterable[tuple]):
+        self._lines = ('\t'.join(map(format_value, row)) + '\n' for row in rows)
+        self._buffer = ''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        if size is None or size < 0:
+            out = self._buffer + ''.join(self._lines)
+            self._buffer = ''
+            return out
+
+        while len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
+
+    def readline(self, size: int = -1) -> str:
+        if self._buffer:
+            out, self._buffer = self._buffer, ''
+            return out
+        return next(self._lines, '')
+
+
+def copy_statement(table: Table) -> str:
+    """COPY statement for a table, listing columns in metadata order"""
+
+    name = f'"{table.name}"' if table.schema is None else f'{table.schema}."{table.name}"'
+    cols = ', '.join(f'"{c.name}"' for c in table.columns)
+    return f'COPY {name} ({cols}) FROM STDIN'
+
+
+def copy_rows(cursor: Any, table: Table, rows: Iterable[tuple]):
+    """Stream row tuples into a table with a psycopg2 cursor
+
+    Row values are in the order the columns are declared in the table metadata.
+    """
+
+    cursor.copy_expert(copy_statement(table), CopyStream(rows))
+
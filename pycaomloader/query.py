@@ -0,0 +1,250 @@
+"""Searches over loaded observations and planes
+
+Results are streamed: rows are fetched yield_per at a time, through a server-side
+cursor where the driver supports it, so large result sets are never held in memory.
+Passing columns selects only those columns instead of whole ORM objects.
+
+Example, planes of a collection overlapping an energy range::
+
+    engine = load_engine(connection_string)
+    with Session(engine) as session:
+        for product_id, uri in search_planes(session, collection='HST', energy_range=(1e-7, 2e-7),
+                                             columns=['product_id', 'planeURI']):
+            ...
+"""
+
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Sequence, Union
+from sqlalchemy import Select, select, or_
+from sqlalchemy.orm import Session
+from pycaomloader.schema import CaomObservation, CaomPlane, CaomObservationMember, CaomProvenanceInput, \
+    CaomObservationMetaReadGroup, CaomPlaneMetaReadGroup, CaomPlaneDataReadGroup
+from pycaomloader.geometry import cone_condition, interval_condition
+
+
+def _in(column, value: Union[str, Sequence[str]]):
+    if isinstance(value, str):
+        return column == value
+    return column.in_(value)
+
+
+def _within(column, value_range: tuple) -> list:
+    """Conditions for an inclusive (start, end) range, either end may be None"""
+
+    start, end = value_range
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return conditions
+
+
+def _columns(model: type, columns: Optional[Sequence]) -> list:
+    """ORM attributes for columns given as attribute names of the model or as attributes"""
+
+    if columns is None:
+        return [model]
+    return [getattr(model, c) if isinstance(c, str) else c for c in columns]
+
+
+def observation_conditions(collection: Union[str, Sequence[str], None] = None,
+                           observation_id: Union[str, Sequence[str], None] = None,
+                           proposal_id: Union[str, Sequence[str], None] = None,
+                           instrument: Union[str, Sequence[str], None] = None) -> list:
+    """Conditions on observation columns, a sequence of values matches any of them"""
+
+    conditions = []
+    for column, value in ((CaomObservation.collection, collection),
+                          (CaomObservation.observation_id, observation_id),
+                          (CaomObservation.proposal_id, proposal_id),
+                          (CaomObservation.instrument_name, instrument)):
+        if value is not None:
+            conditions.append(_in(column, value))
+    return conditions
+
+
+def plane_conditions(dialect: Optional[str] = None,
+                     time_range: Optional[tuple] = None,
+                     energy_range: Optional[tuple] = None,
+                     cone: Optional[tuple] = None,
+                     data_release: Optional[tuple] = None) -> list:
+    """Conditions on plane bounds overlapping time (MJD) or energy (m) ranges or a cone (ra, dec, radius)
+
+    The dialect selects the native interval and spatial indexes, see geometry.py.
+    """
+
+    conditions = []
+    if time_range is not None:
+        conditions.append(interval_condition(dialect, 'time', *time_range))
+    if energy_range is not None:
+        conditions.append(interval_condition(dialect, 'energy', *energy_range))
+    if cone is not None:
+        conditions.append(cone_condition(dialect, *cone))
+    if data_release is not None:
+        conditions += _within(CaomPlane.data_release, data_release)
+    return conditions
+
+
+def access_condition(release, entity_id, group_model: type, groups: Sequence[str], now: Optional[datetime] = None):
+    """Condition on an entity being released, or readable by one of the groups before its release
+
+    The groups are looked up in a read group link table through its groupURI index.
+    Release dates are naive UTC, as in CAOM xml, and so is now.
+    """
+
+    if now is None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+    group_id = next(iter(group_model.__table__.foreign_keys)).parent
+    return or_(release <= now, entity_id.in_(select(group_id).where(group_model.groupURI.in_(groups))))
+
+
+def observation_access(groups: Sequence[str], now: Optional[datetime] = None):
+    """Condition on the metadata of observations being readable by one of the groups"""
+
+    return access_condition(CaomObservation.meta_release, CaomObservation.id, CaomObservationMetaReadGroup, groups, now)
+
+
+def plane_access(groups: Sequence[str], now: Optional[datetime] = None, data: bool = False):
+    """Condition on the metadata, or the data, of planes being readable by one of the groups"""
+
+    if data:
+        return access_condition(CaomPlane.data_release, CaomPlane.id, CaomPlaneDataReadGroup, groups, now)
+    return access_condition(CaomPlane.meta_release, CaomPlane.id, CaomPlaneMetaReadGroup, groups, now)
+
+
+def select_observations(dialect: Optional[str] = None,
+                        columns: Optional[Sequence] = None,
+                        meta_release: Optional[tuple] = None,
+                        time_range: Optional[tuple] = None,
+                        energy_range: Optional[tuple] = None,
+                        cone: Optional[tuple] = None,
+                        member: Union[str, Sequence[str], None] = None,
+                        readable_by: Optional[Sequence[str]] = None,
+                        **kwargs) -> Select:
+    """Statement selecting observations, see search_observations"""
+
+    stmt = select(*_columns(CaomObservation, columns)).where(*observation_conditions(**kwargs))
+    if meta_release is not None:
+        stmt = stmt.where(*_within(CaomObservation.meta_release, meta_release))
+    if readable_by is not None:
+        stmt = stmt.where(observation_access(readable_by))
+
+    # Composite observations with one of the members, through the memberURI index
+    if member is not None:
+        stmt = stmt.where(CaomObservation.id.in_(
+            select(CaomObservationMember.obsID).where(_in(CaomObservationMember.memberURI, member))))
+
+    # Observations with at least one matching plane
+    conditions = plane_conditions(dialect, time_range, energy_range, cone)
+    if conditions:
+        stmt = stmt.where(CaomObservation.id.in_(select(CaomPlane.obsID).where(*conditions)))
+
+    return stmt
+
+
+def select_planes(dialect: Optional[str] = None,
+                  columns: Optional[Sequence] = None,
+                  meta_release: Optional[tuple] = None,
+                  data_release: Optional[tuple] = None,
+                  time_range: Optional[tuple] = None,
+                  energy_range: Optional[tuple] = None,
+                  cone: Optional[tuple] = None,
+                  provenance_input: Union[str, Sequence[str], None] = None,
+                  readable_by: Optional[Sequence[str]] = None,
+                  data_readable_by: Optional[Sequence[str]] = None,
+                  **kwargs) -> Select:
+    """Statement selecting planes, see search_planes"""
+
+    stmt = select(*_columns(CaomPlane, columns)).select_from(CaomPlane)
+
+    # Join the observations when filtering on or selecting their columns
+    conditions = observation_conditions(**kwargs)
+    if conditions or any(getattr(c, 'class_', None) is CaomObservation for c in columns or ()):
+        stmt = stmt.join(CaomPlane.observation).where(*conditions)
+    if meta_release is not None:
+        stmt = stmt.where(*_within(CaomPlane.meta_release, meta_release))
+    if readable_by is not None:
+        stmt = stmt.where(plane_access(readable_by))
+    if data_readable_by is not None:
+        stmt = stmt.where(plane_access(data_readable_by, data=True))
+
+    # Planes derived from one of the inputs, through the inputURI index
+    if provenance_input is not None:
+        stmt = stmt.where(CaomPlane.id.in_(
+            select(CaomProvenanceInput.planeID).where(_in(CaomProvenanceInput.inputURI, provenance_input))))
+
+    return stmt.where(*plane_conditions(dialect, time_range, energy_range, cone, data_release))
+
+
+def stream(session: Session, stmt: Select, yield_per: int = 1000, scalars: bool = False) -> Iterator:
+    """Execute a statement, yielding its rows (or first column with scalars) yield_per at a time"""
+
+    result = session.execute(stmt.execution_options(yield_per=yield_per))
+    if scalars:
+        result = result.scalars()
+    yield from result
+
+
+def search_observations(session: Session,
+                        collection: Union[str, Sequence[str], None] = None,
+                        observation_id: Union[str, Sequence[str], None] = None,
+                        proposal_id: Union[str, Sequence[str], None] = None,
+                        instrument: Union[str, Sequence[str], None] = None,
+                        meta_release: Optional[tuple] = None,
+                        time_range: Optional[tuple] = None,
+                        energy_range: Optional[tuple] = None,
+                        cone: Optional[tuple] = None,
+                        member: Union[str, Sequence[str], None] = None,
+                        readable_by: Optional[Sequence[str]] = None,
+                        columns: Optional[Sequence] = None,
+                        yield_per: int = 1000) -> Iterator:
+    """Stream observations matching all the given filters
+
+    Yields CaomObservation objects, or rows of the requested columns (attribute names of
+    CaomObservation or ORM attributes). meta_release is a (start, end) datetime range.
+    The time_range, energy_range and cone filters match observations with at least one
+    overlapping plane. member matches composite observations with a member observation URI.
+    readable_by is a sequence of group URIs: only observations already released or readable
+    by one of the groups are returned (an empty sequence for anonymous access).
+    """
+
+    stmt = select_observations(session.get_bind().dialect.name, columns, meta_release,
+                               time_range, energy_range, cone, member, readable_by, collection=collection,
+                               observation_id=observation_id, proposal_id=proposal_id,
+                               instrument=instrument)
+    return stream(session, stmt, yield_per, scalars=columns is None)
+
+
+def search_planes(session: Session,
+                  collection: Union[str, Sequence[str], None] = None,
+                  observation_id: Union[str, Sequence[str], None] = None,
+                  proposal_id: Union[str, Sequence[str], None] = None,
+                  instrument: Union[str, Sequence[str], None] = None,
+                  meta_release: Optional[tuple] = None,
+                  data_release: Optional[tuple] = None,
+                  time_range: Optional[tuple] = None,
+                  energy_range: Optional[tuple] = None,
+                  cone: Optional[tuple] = None,
+                  provenance_input: Union[str, Sequence[str], None] = None,
+                  readable_by: Optional[Sequence[str]] = None,
+                  data_readable_by: Optional[Sequence[str]] = None,
+                  columns: Optional[Sequence] = None,
+                  yield_per: int = 1000) -> Iterator:
+    """Stream planes matching all the given filters
+
+    Yields CaomPlane objects, or rows of the requested columns (attribute names of CaomPlane
+    or ORM attributes, eg CaomObservation.collection). meta_release and data_release are
+    (start, end) datetime ranges, time_range an MJD and energy_range a wavelength (m) range,
+    cone is (ra, dec, radius) in degrees. provenance_input matches the planes derived from
+    an input plane URI, eg to find which products used it. readable_by and data_readable_by
+    restrict the planes to those whose metadata, or data, is released or readable by one of
+    the given group URIs.
+    """
+
+    stmt = select_planes(session.get_bind().dialect.name, columns, meta_release, data_release,
+                         time_range, energy_range, cone, provenance_input, readable_by, data_readable_by,
+                         collection=collection,
+                         observation_id=observation_id, proposal_id=proposal_id,
+                         instrument=instrument)
+    return stream(session, stmt, yield_per, scalars=columns is None)
@@ -6,7 +6,7 @@ from datetime import datetime
 from uuid import UUID
 
 from typing import Optional, List
-from sqlalchemy import Integer, String, ForeignKey, Float, MetaData
+from sqlalchemy import Integer, BigInteger, String, ForeignKey, Float, MetaData, Index, DDL, event, func
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column, validates, relationship
@@ -53,17 +53,17 @@ class CaomObservation(CaomCommon, Base):
     # Some attribute names are different from the DB names
     # https://docs.sqlalchemy.org/en/20/orm/mapped_attributes.html#using-descriptors-and-hybrids
 
-    uri: Mapped[str] = mapped_column('observationURI', String)  # caom2:Observation.uri	uri	indexed
+    uri: Mapped[str] = mapped_column('observationURI', String, index=True)  # caom2:Observation.uri	uri	indexed
     id: Mapped[UUID] = mapped_column('obsID', primary_key=True)	# caom2:Observation.id	uuid	indexed
-    collection: Mapped[str] = mapped_column(String(32))  # caom2:Observation.collection		indexed
-    observation_id: Mapped[str] = mapped_column('observationID', String(128))  # caom2:Observation.observationID		indexed
+    collection: Mapped[str] = mapped_column(String(32), index=True)  # caom2:Observation.collection		indexed
+    observation_id: Mapped[str] = mapped_column('observationID', String(128), index=True)  # caom2:Observation.observationID		indexed
     algorithm: Mapped[Optional[str]] = mapped_column('algorithm_name', String(32))  # caom2:Observation.algorithm.name
     type: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Observation.type		
     intent: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Observation.intent		
     sequence_number: Mapped[Optional[int]] = mapped_column('sequenceNumber', Integer)  # caom2:Observation.sequenceNumber		
-    meta_release: Mapped[Optional[datetime]] = mapped_column('metaRelease')  # caom2:Observation.metaRelease	timestamp	
+    meta_release: Mapped[Optional[datetime]] = mapped_column('metaRelease', index=True)  # caom2:Observation.metaRelease	timestamp	indexed
     meta_read_groups: Mapped[Optional[str]] = mapped_column('metaReadGroups')   # caom2:Observation.metaReadGroups		
-    proposal_id: Mapped[Optional[str]] = mapped_column(String(128))  # caom2:Observation.proposal.id		indexed
+    proposal_id: Mapped[Optional[str]] = mapped_column(String(128), index=True)  # caom2:Observation.proposal.id		indexed
     proposal_pi: Mapped[Optional[str]] = mapped_column(String(128))  # caom2:Observation.proposal.pi		
     proposal_project: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Observation.proposal.project		
     proposal_title: Mapped[Optional[str]] = mapped_column(String(256))  # caom2:Observation.proposal.title		
@@ -85,7 +85,7 @@ class CaomObservation(CaomCommon, Base):
     telescope_geo_location_z: Mapped[Optional[float]] = mapped_column('telescope_geoLocationZ', Float)  # caom2:Observation.telescope.geoLocationZ		
     telescope_keywords: Mapped[Optional[str]]  # caom2:Observation.telescope.keywords		
     requirements: Mapped[Optional[str]] = mapped_column('requirements_flag', String(16))  # caom2:Observation.requirements.flag		
-    instrument_name: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Observation.instrument.name		
+    instrument_name: Mapped[Optional[str]] = mapped_column(String(32), index=True)  # caom2:Observation.instrument.name		indexed
     instrument_keywords: Mapped[Optional[str]]  # caom2:Observation.instrument.keywords		
     environment_seeing: Mapped[Optional[float]] # caom2:Observation.environment.seeing		
     environment_humidity: Mapped[Optional[float]]  # caom2:Observation.environment.humidity		
@@ -104,15 +104,17 @@ class CaomObservation(CaomCommon, Base):
     # Using validators to simplify ingest
     # https://docs.sqlalchemy.org/en/20/orm/mapped_attributes.html#simple-validators
 
+    # Values already reduced by flatten.PLAIN_FIELDS are passed through as is
+
     @validates("target_type")
     def get_value(self, key, column):
         if column is not None:
-            return column.value
+            return getattr(column, 'value', column)
     
     @validates("algorithm")
     def get_name(self, key, column):
         if column is not None:
-            return column.name
+            return getattr(column, 'name', column)
 
     def __repr__(self) -> str:
         return repr(f'Observation {self.observation_id}')
@@ -123,15 +125,15 @@ class CaomPlane(CaomCommon, Base):
 
     __tablename__ = "Plane"
 
-    planeURI: Mapped[str] = mapped_column('planeURI', String)  # caom2:Plane.uri	uri	indexed
-    publisherID: Mapped[Optional[str]]  # caom2:Plane.publisherID	uri	indexed
-    obsID: Mapped[UUID]	= mapped_column(ForeignKey("Observation.obsID"))  # obsID	char(36)		true	foreign key			uuid	indexed
+    planeURI: Mapped[str] = mapped_column('planeURI', String, index=True)  # caom2:Plane.uri	uri	indexed
+    publisherID: Mapped[Optional[str]] = mapped_column(index=True)  # caom2:Plane.publisherID	uri	indexed
+    obsID: Mapped[UUID]	= mapped_column(ForeignKey("Observation.obsID"), index=True)  # obsID	char(36)		true	foreign key			uuid	indexed
     id: Mapped[UUID] = mapped_column('planeID', primary_key=True)	# planeID	char(36)		true	unique plane identifier		caom2:Plane.id	uuid	indexed
-    creatorID: Mapped[Optional[str]]  # caom2:Plane.creatorID	uri	indexed
-    product_id: Mapped[str] = mapped_column('productID', String(256))  # caom2:Plane.productID		indexed
-    meta_release: Mapped[Optional[datetime]] = mapped_column('metaRelease')   # caom2:Plane.metaRelease	timestamp	indexed
+    creatorID: Mapped[Optional[str]] = mapped_column(index=True)  # caom2:Plane.creatorID	uri	indexed
+    product_id: Mapped[str] = mapped_column('productID', String(256), index=True)  # caom2:Plane.productID		indexed
+    meta_release: Mapped[Optional[datetime]] = mapped_column('metaRelease', index=True)   # caom2:Plane.metaRelease	timestamp	indexed
     meta_read_groups: Mapped[Optional[str]] = mapped_column('metaReadGroups')  # caom2:Plane.metaReadGroups		
-    data_release: Mapped[Optional[datetime]] = mapped_column('dataRelease')  #  caom2:Plane.dataRelease	timestamp	indexed
+    data_release: Mapped[Optional[datetime]] = mapped_column('dataRelease', index=True)  #  caom2:Plane.dataRelease	timestamp	indexed
     data_read_groups: Mapped[Optional[str]] = mapped_column('dataReadGroups')   # caom2:Plane.dataReadGroups		
     data_product_type: Mapped[Optional[str]] = mapped_column('dataProductType', String(128))  # caom2:Plane.dataProductType		
     calibration_level: Mapped[Optional[int]] = mapped_column('calibrationLevel')  # caom2:Plane.calibrationLevel		
@@ -140,7 +142,7 @@ class CaomPlane(CaomCommon, Base):
     provenance_reference: Mapped[Optional[str]] = mapped_column(String(256))  # caom2:Plane.provenance.reference		
     provenance_producer: Mapped[Optional[str]] = mapped_column(String(128))  # caom2:Plane.provenance.producer		
     provenance_project: Mapped[Optional[str]] = mapped_column(String(256))  # caom2:Plane.provenance.project		
-    provenance_run_id: Mapped[Optional[str]] = mapped_column('provenance_runID', String(64))  # caom2:Plane.provenance.runID		indexed
+    provenance_run_id: Mapped[Optional[str]] = mapped_column('provenance_runID', String(64), index=True)  # caom2:Plane.provenance.runID		indexed
     provenance_last_executed: Mapped[Optional[datetime]] = mapped_column('provenance_lastExecuted')  # caom2:Plane.provenance.lastExecuted	timestamp	
     provenance_keywords: Mapped[Optional[str]]  #caom2:Plane.provenance.keywords		
     provenance_inputs: Mapped[Optional[str]]  # caom2:Plane.provenance.inputs	clob	
@@ -151,22 +153,26 @@ class CaomPlane(CaomCommon, Base):
     metrics_magLimit: Mapped[Optional[float]]   # caom2:Plane.metrics.magLimit		
     quality_flag: Mapped[Optional[str]] = mapped_column(String(16))  # caom2:Plane.quality.flag		
     position_bounds: Mapped[Optional[str]]  # caom2:Plane.position.bounds	caom2:shape	
-    position_bounds_samples: Mapped[Optional[float]]  # caom2:Plane.position.bounds.samples	caom2:multipolygon	
+    position_bounds_samples: Mapped[Optional[str]]  # caom2:Plane.position.bounds.samples	caom2:multipolygon	
     position_bounds_size: Mapped[Optional[float]]  # caom2:Plane.position.bounds.size		
+    position_bounds_ra_min: Mapped[Optional[float]]  # bounding box of caom2:Plane.position.bounds		indexed (geometry.py)
+    position_bounds_ra_max: Mapped[Optional[float]]  # bounding box of caom2:Plane.position.bounds		indexed (geometry.py)
+    position_bounds_dec_min: Mapped[Optional[float]]  # bounding box of caom2:Plane.position.bounds		indexed (geometry.py)
+    position_bounds_dec_max: Mapped[Optional[float]]  # bounding box of caom2:Plane.position.bounds		indexed (geometry.py)
     position_resolution: Mapped[Optional[float]]  # caom2:Plane.position.resolution		
-    position_resolution_bounds: Mapped[Optional[float]] = mapped_column('position_resolutionBounds')  # caom2:Plane.position.resolutionBounds	interval	
+    position_resolution_bounds: Mapped[Optional[str]] = mapped_column('position_resolutionBounds')  # caom2:Plane.position.resolutionBounds	interval	
     position_sampleSize: Mapped[Optional[float]]  # caom2:Plane.position.sampleSize		
     position_dimension_naxis1: Mapped[Optional[int]]  # caom2:Plane.position.dimension.naxis1		
     position_dimension_naxis2: Mapped[Optional[int]]  # caom2:Plane.position.dimension.naxis2		
     position_time_dependent: Mapped[Optional[bool]] = mapped_column('position_timeDependent')  # caom2:Plane.position.timeDependent		
-    energy_bounds: Mapped[Optional[float]]  # caom2:Plane.energy.bounds	interval	indexed
-    energy_bounds_samples: Mapped[Optional[float]]  # caom2:Plane.energy.bounds.samples	caom2:multiinterval	
-    energy_bounds_lower: Mapped[Optional[float]]  # caom2:Plane.energy.bounds.lower		indexed
-    energy_bounds_upper: Mapped[Optional[float]]  # caom2:Plane.energy.bounds.upper		indexed
+    energy_bounds: Mapped[Optional[str]]  # caom2:Plane.energy.bounds	interval	indexed (geometry.py)
+    energy_bounds_samples: Mapped[Optional[str]]  # caom2:Plane.energy.bounds.samples	caom2:multiinterval	
+    energy_bounds_lower: Mapped[Optional[float]] = mapped_column(index=True)  # caom2:Plane.energy.bounds.lower		indexed
+    energy_bounds_upper: Mapped[Optional[float]] = mapped_column(index=True)  # caom2:Plane.energy.bounds.upper		indexed
     energy_bounds_width: Mapped[Optional[float]]  # caom2:Plane.energy.bounds.width		
     energy_dimension: Mapped[Optional[float]]  # caom2:Plane.energy.dimension		
     energy_resolving_power: Mapped[Optional[float]] = mapped_column('energy_resolvingPower')  # caom2:Plane.energy.resolvingPower		
-    energy_resolving_power_bounds: Mapped[Optional[float]] = mapped_column('energy_resolvingPowerBounds')  # caom2:Plane.energy.resolvingPowerBounds	interval	
+    energy_resolving_power_bounds: Mapped[Optional[str]] = mapped_column('energy_resolvingPowerBounds')  # caom2:Plane.energy.resolvingPowerBounds	interval	
     energy_sample_size: Mapped[Optional[float]] = mapped_column('energy_sampleSize')  # caom2:Plane.energy.sampleSize		
     energy_em_band: Mapped[Optional[str]] = mapped_column('energy_emBand', String(32))                 # caom2:Plane.energy.emBand		
     energy_energy_bands: Mapped[Optional[str]] = mapped_column('energy_energyBands', String(32))            # caom2:Plane.energy.energyBands		
@@ -175,22 +181,22 @@ class CaomPlane(CaomCommon, Base):
     energy_transition_transition: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Plane.energy.transition.transition		
     energy_freq_width: Mapped[Optional[float]] = mapped_column('energy_freqWidth')      # caom2:Plane.energy.freqWidth		
     energy_freq_sample_size: Mapped[Optional[float]] = mapped_column('energy_freqSampleSize') # caom2:Plane.energy.freqSampleSize		
-    energy_restwav: Mapped[Optional[float]]        # caom2:Plane.energy.restwav		indexed
-    time_bounds: Mapped[Optional[float]]           # caom2:Plane.time.bounds	interval	indexed
-    time_bounds_lower: Mapped[Optional[float]]     # caom2:Plane.time.bounds.lower		indexed
-    time_bounds_samples: Mapped[Optional[float]]   # caom2:Plane.time.bounds.samples	caom2:multiinterval	
-    time_bounds_upper: Mapped[Optional[float]]     # caom2:Plane.time.bounds.upper		indexed
-    time_bounds_width: Mapped[Optional[float]]     # indexed
+    energy_restwav: Mapped[Optional[float]] = mapped_column(index=True)  # caom2:Plane.energy.restwav		indexed
+    time_bounds: Mapped[Optional[str]]             # caom2:Plane.time.bounds	interval	indexed (geometry.py)
+    time_bounds_lower: Mapped[Optional[float]] = mapped_column(index=True)  # caom2:Plane.time.bounds.lower		indexed
+    time_bounds_samples: Mapped[Optional[str]]     # caom2:Plane.time.bounds.samples	caom2:multiinterval	
+    time_bounds_upper: Mapped[Optional[float]] = mapped_column(index=True)  # caom2:Plane.time.bounds.upper		indexed
+    time_bounds_width: Mapped[Optional[float]] = mapped_column(index=True)  # indexed
     time_dimension: Mapped[Optional[int]]          # caom2:Plane.time.dimension		
     time_resolution: Mapped[Optional[float]]       # caom2:Plane.time.resolution		
-    time_resolutionBounds: Mapped[Optional[float]] # caom2:Plane.time.resolutionBounds	interval	
+    time_resolution_bounds: Mapped[Optional[str]] = mapped_column('time_resolutionBounds')  # caom2:Plane.time.resolutionBounds	interval	
     time_sampleSize: Mapped[Optional[float]]       # caom2:Plane.time.sampleSize		
     time_exposure: Mapped[Optional[float]]         # caom2:Plane.time.exposure		
     polarization_states: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Plane.polarization.states		
     polarization_dimension: Mapped[Optional[int]]  # caom2:Plane.polarization.dimension		
     custom_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Plane.custom.ctype		
-    custom_bounds: Mapped[Optional[float]]  # caom2:Plane.custom.bounds	interval	
-    custom_bounds_samples: Mapped[Optional[float]]  # caom2:Plane.custom.bounds.samples	caom2:multiinterval	
+    custom_bounds: Mapped[Optional[str]]  # caom2:Plane.custom.bounds	interval	
+    custom_bounds_samples: Mapped[Optional[str]]  # caom2:Plane.custom.bounds.samples	caom2:multiinterval	
     custom_bounds_lower: Mapped[Optional[float]]  # caom2:Plane.custom.bounds.lower		
     custom_bounds_upper: Mapped[Optional[float]]  # caom2:Plane.custom.bounds.upper		
     custom_bounds_width: Mapped[Optional[float]]  # caom2:Plane.custom.bounds.width		
@@ -199,11 +205,324 @@ class CaomPlane(CaomCommon, Base):
 
     # Relationships
     observation = relationship("CaomObservation", back_populates="planes")
+    artifacts: Mapped[List["CaomArtifact"]] = relationship(back_populates="plane")
 
     @validates("calibration_level", "data_product_type")
     def get_value(self, key, column):
         if column is not None:
-            return column.value
+            return getattr(column, 'value', column)
 
     def __repr__(self) -> str:
         return repr(f'Plane {self.product_id}')
+
+
+# Spatial and interval indexes of the plane bounds, see geometry.py
+# PostgreSQL: GiST indexes on boxes (intervals are boxes of zero height)
+Index('Plane_position_box',
+      func.box(func.point(CaomPlane.position_bounds_ra_min, CaomPlane.position_bounds_dec_min),
+               func.point(CaomPlane.position_bounds_ra_max, CaomPlane.position_bounds_dec_max)),
+      postgresql_using='gist').ddl_if(dialect='postgresql')
+Index('Plane_energy_box',
+      func.box(func.point(CaomPlane.energy_bounds_lower, 0.), func.point(CaomPlane.energy_bounds_upper, 0.)),
+      postgresql_using='gist').ddl_if(dialect='postgresql')
+Index('Plane_time_box',
+      func.box(func.point(CaomPlane.time_bounds_lower, 0.), func.point(CaomPlane.time_bounds_upper, 0.)),
+      postgresql_using='gist').ddl_if(dialect='postgresql')
+
+# SQLite: R*Tree virtual tables keyed by the Plane rowid, kept up to date by triggers
+PLANE_RTREES = {'Plane_position_rtree': ('position_bounds_ra_min', 'position_bounds_ra_max',
+                                         'position_bounds_dec_min', 'position_bounds_dec_max'),
+                'Plane_energy_rtree': ('energy_bounds_lower', 'energy_bounds_upper'),
+                'Plane_time_rtree': ('time_bounds_lower', 'time_bounds_upper')}
+
+for rtree, columns in PLANE_RTREES.items():
+    values = ', '.join(f'new."{c}"' for c in columns)
+    insert_rtree = f'INSERT INTO "{rtree}" SELECT new.rowid, {values} WHERE new."{columns[0]}" IS NOT NULL;'
+    delete_rtree = f'DELETE FROM "{rtree}" WHERE id = old.rowid;'
+    for ddl in (f'CREATE VIRTUAL TABLE IF NOT EXISTS caom2."{rtree}" '
+                f'USING rtree(id, {", ".join(c.split("bounds_")[1] for c in columns)})',
+                f'CREATE TRIGGER IF NOT EXISTS caom2."{rtree}_insert" AFTER INSERT ON "Plane" '
+                f'BEGIN {insert_rtree} END',
+                f'CREATE TRIGGER IF NOT EXISTS caom2."{rtree}_delete" AFTER DELETE ON "Plane" '
+                f'BEGIN {delete_rtree} END',
+                f'CREATE TRIGGER IF NOT EXISTS caom2."{rtree}_update" AFTER UPDATE ON "Plane" '
+                f'BEGIN {delete_rtree} {insert_rtree} END'):
+        event.listen(CaomPlane.__table__, 'after_create', DDL(ddl).execute_if(dialect='sqlite'))
+    event.listen(CaomPlane.__table__, 'before_drop',
+                 DDL(f'DROP TABLE IF EXISTS caom2."{rtree}"').execute_if(dialect='sqlite'))
+
+
+class CaomArtifact(CaomCommon, Base):
+    """ CAOM Artifact table """
+
+    __tablename__ = "Artifact"
+
+    uri: Mapped[str] = mapped_column(String, index=True)  # caom2:Artifact.uri	uri	indexed
+    product_type: Mapped[Optional[str]] = mapped_column('productType', String(64))  # caom2:Artifact.productType		
+    release_type: Mapped[Optional[str]] = mapped_column('releaseType', String(16))  # caom2:Artifact.releaseType		
+    content_type: Mapped[Optional[str]] = mapped_column('contentType', String(128))  # caom2:Artifact.contentType		
+    content_length: Mapped[Optional[int]] = mapped_column('contentLength', BigInteger)  # caom2:Artifact.contentLength		
+    content_checksum: Mapped[Optional[str]] = mapped_column('contentChecksum')  # caom2:Artifact.contentChecksum	uri	
+    content_release: Mapped[Optional[datetime]] = mapped_column('contentRelease')  # caom2:Artifact.contentRelease	timestamp	
+    content_read_groups: Mapped[Optional[str]] = mapped_column('contentReadGroups')  # caom2:Artifact.contentReadGroups		
+    planeID: Mapped[UUID] = mapped_column(ForeignKey("Plane.planeID"), index=True)  # planeID	char(36)		true	foreign key			uuid	indexed
+    id: Mapped[UUID] = mapped_column('artifactID', primary_key=True)  # caom2:Artifact.id	uuid	indexed
+    meta_producer: Mapped[Optional[str]] = mapped_column('metaProducer')  # caom2:Artifact.metaProducer	uri	
+
+    # Relationships
+    plane = relationship("CaomPlane", back_populates="artifacts")
+    parts: Mapped[List["CaomPart"]] = relationship(back_populates="artifact")
+
+    @validates("product_type", "release_type")
+    def get_value(self, key, column):
+        if column is not None:
+            return getattr(column, 'value', column)
+
+    def __repr__(self) -> str:
+        return repr(f'Artifact {self.uri}')
+
+
+class CaomPart(CaomCommon, Base):
+    """ CAOM Part table """
+
+    __tablename__ = "Part"
+
+    name: Mapped[str] = mapped_column(String(256))  # caom2:Part.name		
+    product_type: Mapped[Optional[str]] = mapped_column('productType', String(64))  # caom2:Part.productType		
+    artifactID: Mapped[UUID] = mapped_column(ForeignKey("Artifact.artifactID"), index=True)  # artifactID	char(36)		true	foreign key			uuid	indexed
+    id: Mapped[UUID] = mapped_column('partID', primary_key=True)  # caom2:Part.id	uuid	indexed
+    meta_producer: Mapped[Optional[str]] = mapped_column('metaProducer')  # caom2:Part.metaProducer	uri	
+
+    # Relationships
+    artifact = relationship("CaomArtifact", back_populates="parts")
+    chunks: Mapped[List["CaomChunk"]] = relationship(back_populates="part")
+
+    @validates("product_type")
+    def get_value(self, key, column):
+        if column is not None:
+            return getattr(column, 'value', column)
+
+    def __repr__(self) -> str:
+        return repr(f'Part {self.name}')
+
+
+class CaomChunk(CaomCommon, Base):
+    """ CAOM Chunk table """
+
+    __tablename__ = "Chunk"
+
+    # WCS attributes are flattened like the plane ones, eg caom2:Chunk.position.axis.axis1.ctype
+    product_type: Mapped[Optional[str]] = mapped_column('productType', String(64))  # caom2:Chunk.productType		
+    naxis: Mapped[Optional[int]]  # caom2:Chunk.naxis
+    positionAxis1: Mapped[Optional[int]]  # caom2:Chunk.positionAxis1
+    positionAxis2: Mapped[Optional[int]]  # caom2:Chunk.positionAxis2
+    energyAxis: Mapped[Optional[int]]  # caom2:Chunk.energyAxis
+    timeAxis: Mapped[Optional[int]]  # caom2:Chunk.timeAxis
+    polarizationAxis: Mapped[Optional[int]]  # caom2:Chunk.polarizationAxis
+    observableAxis: Mapped[Optional[int]]  # caom2:Chunk.observableAxis
+    customAxis: Mapped[Optional[int]]  # caom2:Chunk.customAxis
+    position_axis_axis1_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.position.axis.axis1.ctype
+    position_axis_axis1_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.position.axis.axis1.cunit
+    position_axis_axis2_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.position.axis.axis2.ctype
+    position_axis_axis2_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.position.axis.axis2.cunit
+    position_axis_error1_syser: Mapped[Optional[float]]  # caom2:Chunk.position.axis.error1.syser
+    position_axis_error1_rnder: Mapped[Optional[float]]  # caom2:Chunk.position.axis.error1.rnder
+    position_axis_error2_syser: Mapped[Optional[float]]  # caom2:Chunk.position.axis.error2.syser
+    position_axis_error2_rnder: Mapped[Optional[float]]  # caom2:Chunk.position.axis.error2.rnder
+    position_axis_range_start_coord1_pix: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.start.coord1.pix
+    position_axis_range_start_coord1_val: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.start.coord1.val
+    position_axis_range_start_coord2_pix: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.start.coord2.pix
+    position_axis_range_start_coord2_val: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.start.coord2.val
+    position_axis_range_end_coord1_pix: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.end.coord1.pix
+    position_axis_range_end_coord1_val: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.end.coord1.val
+    position_axis_range_end_coord2_pix: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.end.coord2.pix
+    position_axis_range_end_coord2_val: Mapped[Optional[float]]  # caom2:Chunk.position.axis.range.end.coord2.val
+    position_axis_function_dimension_naxis1: Mapped[Optional[int]]  # caom2:Chunk.position.axis.function.dimension.naxis1
+    position_axis_function_dimension_naxis2: Mapped[Optional[int]]  # caom2:Chunk.position.axis.function.dimension.naxis2
+    position_axis_function_ref_coord_coord1_pix: Mapped[Optional[float]] = mapped_column('position_axis_function_refCoord_coord1_pix')  # caom2:Chunk.position.axis.function.refCoord.coord1.pix
+    position_axis_function_ref_coord_coord1_val: Mapped[Optional[float]] = mapped_column('position_axis_function_refCoord_coord1_val')  # caom2:Chunk.position.axis.function.refCoord.coord1.val
+    position_axis_function_ref_coord_coord2_pix: Mapped[Optional[float]] = mapped_column('position_axis_function_refCoord_coord2_pix')  # caom2:Chunk.position.axis.function.refCoord.coord2.pix
+    position_axis_function_ref_coord_coord2_val: Mapped[Optional[float]] = mapped_column('position_axis_function_refCoord_coord2_val')  # caom2:Chunk.position.axis.function.refCoord.coord2.val
+    position_axis_function_cd11: Mapped[Optional[float]]  # caom2:Chunk.position.axis.function.cd11
+    position_axis_function_cd12: Mapped[Optional[float]]  # caom2:Chunk.position.axis.function.cd12
+    position_axis_function_cd21: Mapped[Optional[float]]  # caom2:Chunk.position.axis.function.cd21
+    position_axis_function_cd22: Mapped[Optional[float]]  # caom2:Chunk.position.axis.function.cd22
+    position_coordsys: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.position.coordsys
+    position_equinox: Mapped[Optional[float]]  # caom2:Chunk.position.equinox
+    position_resolution: Mapped[Optional[float]]  # caom2:Chunk.position.resolution
+    energy_axis_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.energy.axis.axis.ctype
+    energy_axis_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.energy.axis.axis.cunit
+    energy_axis_error_syser: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.error.syser
+    energy_axis_error_rnder: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.error.rnder
+    energy_axis_range_start_pix: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.range.start.pix
+    energy_axis_range_start_val: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.range.start.val
+    energy_axis_range_end_pix: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.range.end.pix
+    energy_axis_range_end_val: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.range.end.val
+    energy_axis_function_naxis: Mapped[Optional[int]]  # caom2:Chunk.energy.axis.function.naxis
+    energy_axis_function_delta: Mapped[Optional[float]]  # caom2:Chunk.energy.axis.function.delta
+    energy_axis_function_ref_coord_pix: Mapped[Optional[float]] = mapped_column('energy_axis_function_refCoord_pix')  # caom2:Chunk.energy.axis.function.refCoord.pix
+    energy_axis_function_ref_coord_val: Mapped[Optional[float]] = mapped_column('energy_axis_function_refCoord_val')  # caom2:Chunk.energy.axis.function.refCoord.val
+    energy_specsys: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.energy.specsys
+    energy_ssysobs: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.energy.ssysobs
+    energy_ssyssrc: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.energy.ssyssrc
+    energy_restfrq: Mapped[Optional[float]]  # caom2:Chunk.energy.restfrq
+    energy_restwav: Mapped[Optional[float]]  # caom2:Chunk.energy.restwav
+    energy_velosys: Mapped[Optional[float]]  # caom2:Chunk.energy.velosys
+    energy_zsource: Mapped[Optional[float]]  # caom2:Chunk.energy.zsource
+    energy_velang: Mapped[Optional[float]]  # caom2:Chunk.energy.velang
+    energy_bandpass_name: Mapped[Optional[str]] = mapped_column('energy_bandpassName', String(32))  # caom2:Chunk.energy.bandpassName
+    energy_resolving_power: Mapped[Optional[float]] = mapped_column('energy_resolvingPower')  # caom2:Chunk.energy.resolvingPower
+    time_axis_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.time.axis.axis.ctype
+    time_axis_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.time.axis.axis.cunit
+    time_axis_error_syser: Mapped[Optional[float]]  # caom2:Chunk.time.axis.error.syser
+    time_axis_error_rnder: Mapped[Optional[float]]  # caom2:Chunk.time.axis.error.rnder
+    time_axis_range_start_pix: Mapped[Optional[float]]  # caom2:Chunk.time.axis.range.start.pix
+    time_axis_range_start_val: Mapped[Optional[float]]  # caom2:Chunk.time.axis.range.start.val
+    time_axis_range_end_pix: Mapped[Optional[float]]  # caom2:Chunk.time.axis.range.end.pix
+    time_axis_range_end_val: Mapped[Optional[float]]  # caom2:Chunk.time.axis.range.end.val
+    time_axis_function_naxis: Mapped[Optional[int]]  # caom2:Chunk.time.axis.function.naxis
+    time_axis_function_delta: Mapped[Optional[float]]  # caom2:Chunk.time.axis.function.delta
+    time_axis_function_ref_coord_pix: Mapped[Optional[float]] = mapped_column('time_axis_function_refCoord_pix')  # caom2:Chunk.time.axis.function.refCoord.pix
+    time_axis_function_ref_coord_val: Mapped[Optional[float]] = mapped_column('time_axis_function_refCoord_val')  # caom2:Chunk.time.axis.function.refCoord.val
+    time_timesys: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.time.timesys
+    time_trefpos: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.time.trefpos
+    time_mjdref: Mapped[Optional[float]]  # caom2:Chunk.time.mjdref
+    time_exposure: Mapped[Optional[float]]  # caom2:Chunk.time.exposure
+    time_resolution: Mapped[Optional[float]]  # caom2:Chunk.time.resolution
+    polarization_axis_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.polarization.axis.axis.ctype
+    polarization_axis_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.polarization.axis.axis.cunit
+    polarization_axis_error_syser: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.error.syser
+    polarization_axis_error_rnder: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.error.rnder
+    polarization_axis_range_start_pix: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.range.start.pix
+    polarization_axis_range_start_val: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.range.start.val
+    polarization_axis_range_end_pix: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.range.end.pix
+    polarization_axis_range_end_val: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.range.end.val
+    polarization_axis_function_naxis: Mapped[Optional[int]]  # caom2:Chunk.polarization.axis.function.naxis
+    polarization_axis_function_delta: Mapped[Optional[float]]  # caom2:Chunk.polarization.axis.function.delta
+    polarization_axis_function_ref_coord_pix: Mapped[Optional[float]] = mapped_column('polarization_axis_function_refCoord_pix')  # caom2:Chunk.polarization.axis.function.refCoord.pix
+    polarization_axis_function_ref_coord_val: Mapped[Optional[float]] = mapped_column('polarization_axis_function_refCoord_val')  # caom2:Chunk.polarization.axis.function.refCoord.val
+    observable_dependent_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.observable.dependent.axis.ctype
+    observable_dependent_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.observable.dependent.axis.cunit
+    observable_dependent_bin: Mapped[Optional[int]]  # caom2:Chunk.observable.dependent.bin
+    observable_independent_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.observable.independent.axis.ctype
+    observable_independent_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.observable.independent.axis.cunit
+    observable_independent_bin: Mapped[Optional[int]]  # caom2:Chunk.observable.independent.bin
+    custom_axis_axis_ctype: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.custom.axis.axis.ctype
+    custom_axis_axis_cunit: Mapped[Optional[str]] = mapped_column(String(32))  # caom2:Chunk.custom.axis.axis.cunit
+    custom_axis_error_syser: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.error.syser
+    custom_axis_error_rnder: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.error.rnder
+    custom_axis_range_start_pix: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.range.start.pix
+    custom_axis_range_start_val: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.range.start.val
+    custom_axis_range_end_pix: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.range.end.pix
+    custom_axis_range_end_val: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.range.end.val
+    custom_axis_function_naxis: Mapped[Optional[int]]  # caom2:Chunk.custom.axis.function.naxis
+    custom_axis_function_delta: Mapped[Optional[float]]  # caom2:Chunk.custom.axis.function.delta
+    custom_axis_function_ref_coord_pix: Mapped[Optional[float]] = mapped_column('custom_axis_function_refCoord_pix')  # caom2:Chunk.custom.axis.function.refCoord.pix
+    custom_axis_function_ref_coord_val: Mapped[Optional[float]] = mapped_column('custom_axis_function_refCoord_val')  # caom2:Chunk.custom.axis.function.refCoord.val
+    partID: Mapped[UUID] = mapped_column(ForeignKey("Part.partID"), index=True)  # partID	char(36)		true	foreign key			uuid	indexed
+    id: Mapped[UUID] = mapped_column('chunkID', primary_key=True)  # caom2:Chunk.id	uuid	indexed
+    meta_producer: Mapped[Optional[str]] = mapped_column('metaProducer')  # caom2:Chunk.metaProducer	uri	
+
+    # Relationships
+    part = relationship("CaomPart", back_populates="chunks")
+
+    @validates("product_type")
+    def get_value(self, key, column):
+        if column is not None:
+            return getattr(column, 'value', column)
+
+    def __repr__(self) -> str:
+        return repr(f'Chunk {self.id}')
+
+
+class CaomObservationMember(Base):
+    """Members of composite/derived observations, one row per member (link table)"""
+
+    __tablename__ = "ObservationMember"
+
+    obsID: Mapped[UUID] = mapped_column(ForeignKey("Observation.obsID"), primary_key=True)  # composite observation	uuid	indexed (primary key)
+    memberURI: Mapped[str] = mapped_column(String(512), primary_key=True, index=True)  # caom2:Observation.members	uri	indexed
+
+    # Relationships, so the ORM inserts the observation first
+    observation = relationship("CaomObservation")
+
+    def __repr__(self) -> str:
+        return repr(f'ObservationMember {self.obsID} {self.memberURI}')
+
+
+class CaomProvenanceInput(Base):
+    """Inputs of the provenance of planes, one row per input plane (link table)"""
+
+    __tablename__ = "ProvenanceInput"
+
+    planeID: Mapped[UUID] = mapped_column(ForeignKey("Plane.planeID"), primary_key=True)  # output plane	uuid	indexed (primary key)
+    inputURI: Mapped[str] = mapped_column(String(512), primary_key=True, index=True)  # caom2:Plane.provenance.inputs	uri	indexed
+
+    # Relationships, so the ORM inserts the plane first
+    plane = relationship("CaomPlane")
+
+    def __repr__(self) -> str:
+        return repr(f'ProvenanceInput {self.planeID} {self.inputURI}')
+
+
+class CaomObservationMetaReadGroup(Base):
+    """Groups allowed to read the metadata of an observation before its metaRelease (link table)"""
+
+    __tablename__ = "ObservationMetaReadGroup"
+
+    obsID: Mapped[UUID] = mapped_column(ForeignKey("Observation.obsID"), primary_key=True)  # observation	uuid	indexed (primary key)
+    groupURI: Mapped[str] = mapped_column(String(512), primary_key=True, index=True)  # caom2:Observation.metaReadGroups	uri	indexed
+
+    # Relationships, so the ORM inserts the observation first
+    observation = relationship("CaomObservation")
+
+    def __repr__(self) -> str:
+        return repr(f'ObservationMetaReadGroup {self.obsID} {self.groupURI}')
+
+
+class CaomPlaneMetaReadGroup(Base):
+    """Groups allowed to read the metadata of a plane before its metaRelease (link table)"""
+
+    __tablename__ = "PlaneMetaReadGroup"
+
+    planeID: Mapped[UUID] = mapped_column(ForeignKey("Plane.planeID"), primary_key=True)  # plane	uuid	indexed (primary key)
+    groupURI: Mapped[str] = mapped_column(String(512), primary_key=True, index=True)  # caom2:Plane.metaReadGroups	uri	indexed
+
+    # Relationships, so the ORM inserts the plane first
+    plane = relationship("CaomPlane")
+
+    def __repr__(self) -> str:
+        return repr(f'PlaneMetaReadGroup {self.planeID} {self.groupURI}')
+
+
+class CaomPlaneDataReadGroup(Base):
+    """Groups allowed to read the data of a plane before its dataRelease (link table)"""
+
+    __tablename__ = "PlaneDataReadGroup"
+
+    planeID: Mapped[UUID] = mapped_column(ForeignKey("Plane.planeID"), primary_key=True)  # plane	uuid	indexed (primary key)
+    groupURI: Mapped[str] = mapped_column(String(512), primary_key=True, index=True)  # caom2:Plane.dataReadGroups	uri	indexed
+
+    # Relationships, so the ORM inserts the plane first
+    plane = relationship("CaomPlane")
+
+    def __repr__(self) -> str:
+        return repr(f'PlaneDataReadGroup {self.planeID} {self.groupURI}')
+
+
+class IngestLedger(Base):
+    """Ingest progress ledger, one row per source file, written with its data (not part of CAOM)"""
+
+    __tablename__ = "IngestLedger"
+
+    path: Mapped[str] = mapped_column(String(1024), primary_key=True)  # file name or archive!member	indexed
+    size: Mapped[Optional[int]] = mapped_column(BigInteger)  # bytes
+    mtime: Mapped[Optional[float]]  # modification time (s since epoch), None for archive members and streams
+    hash: Mapped[Optional[str]] = mapped_column(String(64))  # sha256 of the content
+    status: Mapped[str] = mapped_column(String(16), index=True)  # committed or failed	indexed
+    obsID: Mapped[Optional[UUID]]  # observation loaded from the file
+    error: Mapped[Optional[str]]  # reason of the failure
+    ingested: Mapped[Optional[datetime]]  # time the status was recorded
+
+    def __repr__(self) -> str:
+        return repr(f'IngestLedger {self.path} {self.status}')
@@ -0,0 +1,160 @@
+"""Streaming sources of observation xml: tar/zip archives, compressed and concatenated files,
+and documents wrapping many observations"""
+
+import io
+import os
+import re
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+from typing import Any, Iterator, Union
+from lxml import etree
+
+# Closing tag of an observation document, used to split concatenated xml
+_END_TAG = re.compile(rb'</(?:[\w.-]+:)?Observation\s*>')
+
+# Bytes read at a time when splitting concatenated xml
+CHUNK_SIZE = 1 << 20
+
+# First element tag of a document, skipping the xml declaration and comments
+_ROOT_TAG = re.compile(rb'<(?![?!])(?:[\w.-]+:)?([\w.-]+)')
+
+
+class _RawReader(io.RawIOBase):
+    """Adapt any object with a read method so it can be wrapped in a BufferedReader"""
+
+    def __init__(self, fileobj: Any):
+        self._fileobj = fileobj
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._fileobj.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _peekable(fileobj: Any) -> Any:
+    """Return a file-like object supporting peek"""
+
+    if hasattr(fileobj, 'peek'):
+        return fileobj
+    return io.BufferedReader(_RawReader(fileobj))
+
+
+def _decompress(fileobj: Any) -> Any:
+    """Transparently decompress gzip, bzip2 or xz streams"""
+
+    head = fileobj.peek(6)[:6]
+    if head.startswith(b'\x1f\x8b'):
+        return _peekable(gzip.GzipFile(fileobj=fileobj))
+    if head.startswith(b'BZh'):
+        return _peekable(bz2.BZ2File(fileobj))
+    if head.startswith(b'\xfd7zXZ\x00'):
+        return _peekable(lzma.LZMAFile(fileobj))
+    return fileobj
+
+
+def _split(fileobj: Any) -> Iterator[bytes]:
+    """Yield the documents of a stream of concatenated observations"""
+
+    buffer = b''
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        buffer += chunk
+        start = 0
+        for match in _END_TAG.finditer(buffer):
+            yield buffer[start:match.end()].strip()
+            start = match.end()
+        buffer = buffer[start:]
+        if not chunk:
+            break
+
+    if buffer.strip():
+        # Let the xml reader report what is wrong with the trailing content
+        yield buffer.strip()
+
+
+def split_documents(fileobj: Any, name: str) -> Iterator[tuple]:
+    """Yield (name, xml content) for one or more concatenated observation documents
+
+    A lone document keeps the stream name, otherwise they are named name#0, name#1, ...
+    """
+
+    docs = _split(fileobj)
+    first = next(docs, None)
+    if first is None:
+        return
+    second = next(docs, None)
+    if second is None:
+        yield name, first
+        return
+
+    yield f'{name}#0', first
+    yield f'{name}#1', second
+    for n, doc in enumerate(docs, 2):
+        yield f'{name}#{n}', doc
+
+
+def iter_elements(fileobj: Any, name: str) -> Iterator[tuple]:
+    """Yield (name#n, xml content) for the observations of a document wrapping many of them
+
+    The document is parsed incrementally with iterparse and each observation element is
+    cleared once serialized, so memory is bounded by the largest observation rather than
+    the whole document.
+    """
+
+    for n, (_, element) in enumerate(etree.iterparse(fileobj, events=('end',), tag='{*}Observation',
+                                                     huge_tree=True)):
+        yield f'{name}#{n}', etree.tostring(element)
+
+        # Drop the element and those already seen
+        element.clear()
+        parent = element.getparent()
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_stream(fileobj: Any, name: str = '<stream>') -> Iterator[tuple]:
+    """Yield (name, xml content) for every observation in a file-like object
+
+    The stream is read sequentially in a single pass, so it may be a pipe or socket.
+    Tar archives and (concatenated) xml may be gzip, bzip2 or xz compressed.
+    Zip archives need a seekable file. Xml documents whose root is not an observation
+    are streamed with iter_elements.
+    """
+
+    fileobj = _decompress(_peekable(fileobj))
+    head = fileobj.peek(512)[:512]
+
+    if len(head) >= 262 and head[257:262] == b'ustar':
+        with tarfile.open(fileobj=fileobj, mode='r|') as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith('.xml'):
+                    yield f'{name}!{member.name}', tar.extractfile(member).read()
+    elif head.startswith(b'PK\x03\x04'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.endswith('.xml'):
+                    yield f'{name}!{member.filename}', archive.read(member)
+    else:
+        root = _ROOT_TAG.search(head)
+        if root is not None and root.group(1) != b'Observation':
+            yield from iter_elements(fileobj, name)
+        else:
+            yield from split_documents(fileobj, name)
+
+
+def iter_sources(source: Union[str, os.PathLike, Any]) -> Iterator[tuple]:
+    """Yield (name, xml content) for every observation in a file path or file-like object"""
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from iter_stream(f, name=os.fspath(source))
+    else:
+        # Pipes and sockets may be named by their file descriptor
+        name = getattr(source, 'name', None)
+        yield from iter_stream(source, name=name if isinstance(name, str) else '<stream>')
@@ -0,0 +1,106 @@
+"""Timing and counters for the ingest pipeline"""
+
+import json
+import time
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestStats:
+    """Per-stage wall/CPU timers, counters and batch sizes of an ingest run
+
+    Hooks are called as hook(stage, wall_seconds, cpu_seconds) every time a stage is
+    recorded, for example to feed an external metrics system while a load is running.
+    Stages measured in worker processes are merged in when their results arrive.
+    """
+
+    def __init__(self, hooks: Optional[Iterable[Callable]] = None):
+        self.wall = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.batches = {'count': 0, 'total': 0, 'min': None, 'max': None}
+        self.hooks = list(hooks or [])
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as a stage"""
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def record(self, name: str, wall: float, cpu: float, calls: int = 1):
+        """Add a stage measurement"""
+
+        self.wall[name] += wall
+        self.cpu[name] += cpu
+        self.calls[name] += calls
+        for hook in self.hooks:
+            hook(name, wall, cpu)
+
+    def count(self, name: str, n: int = 1):
+        """Increase a counter"""
+
+        self.counters[name] += n
+
+    def batch(self, size: int):
+        """Record the number of files in a committed batch"""
+
+        b = self.batches
+        b['count'] += 1
+        b['total'] += size
+        b['min'] = size if b['min'] is None else min(b['min'], size)
+        b['max'] = size if b['max'] is None else max(b['max'], size)
+
+    def merge(self, other: dict):
+        """Merge stages and counters from another run's to_dict, e.g. from a worker process"""
+
+        for name, stage in other['stages'].items():
+            self.record(name, stage['wall'], stage['cpu'], stage['calls'])
+        for name, n in other['counters'].items():
+            self.count(name, n)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> dict:
+        """Plain dictionary of all measurements"""
+
+        return {'elapsed': self.elapsed,
+                'stages': {name: {'wall': self.wall[name], 'cpu': self.cpu[name], 'calls': self.calls[name]}
+                           for name in self.wall},
+                'counters': dict(self.counters),
+                'batches': dict(self.batches)}
+
+    def to_prometheus(self, prefix: str = 'pycaomloader') -> str:
+        """Measurements in the Prometheus text exposition format"""
+
+        lines = [f'# TYPE {prefix}_stage_wall_seconds counter',
+                 *(f'{prefix}_stage_wall_seconds{{stage="{k}"}} {v}' for k, v in self.wall.items()),
+                 f'# TYPE {prefix}_stage_cpu_seconds counter',
+                 *(f'{prefix}_stage_cpu_seconds{{stage="{k}"}} {v}' for k, v in self.cpu.items()),
+                 f'# TYPE {prefix}_stage_calls_total counter',
+                 *(f'{prefix}_stage_calls_total{{stage="{k}"}} {v}' for k, v in self.calls.items())]
+        for name, n in self.counters.items():
+            lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {n}']
+        lines += [f'# TYPE {prefix}_batches_total counter', f"{prefix}_batches_total {self.batches['count']}",
+                  f'# TYPE {prefix}_batch_files_total counter', f"{prefix}_batch_files_total {self.batches['total']}",
+                  f'# TYPE {prefix}_elapsed_seconds gauge', f'{prefix}_elapsed_seconds {self.elapsed}']
+        return '\n'.join(lines) + '\n'
+
+    def log(self, level: int = logging.INFO, log: Optional[logging.Logger] = None):
+        """Log the measurements as one JSON document, also attached as the record's ingest_stats"""
+
+        log = log or logger
+        if log.isEnabledFor(level):
+            stats = self.to_dict()
+            log.log(level, 'ingest stats %s', json.dumps(stats), extra={'ingest_stats': stats})
@@ -0,0 +1,90 @@
+import os
+import re
+import uuid
+import caom2
+import pytest
+from sqlalchemy import event, func, select
+from pycaomloader.load import load_engine, prepare_database, dispose_engines
+from pycaomloader.schema import CaomObservation
+
+HST_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a.xml')
+HST_ID = 'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a'
+# Sample observations shipped with caom2
+CAOM2_DATA = os.path.join(os.path.dirname(caom2.__file__), 'tests', 'data')
+DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Edits of the bundled observation for make_observation, the first two keep its length
+NEW_TARGET = (r'<caom2:name>NGC6293</caom2:name>', '<caom2:name>NGC6294</caom2:name>')
+NEW_CHECKSUM = (r'caom2:accMetaChecksum="md5:3d6e431ef1ff69e1f38c0f7381a7cc11"',
+                'caom2:accMetaChecksum="md5:00000000000000000000000000000001"')
+NO_CHECKSUM = (r' caom2:accMetaChecksum="md5:3d6e431ef1ff69e1f38c0f7381a7cc11"', '')
+NO_PREVIEW = (r'<caom2:artifact caom2:id="30f53abb[^>]*>.*?</caom2:artifact>', '')
+NO_MEMBERS = (r'<caom2:members>.*?</caom2:members>', '')
+
+
+@pytest.fixture
+def connection_string(tmp_path):
+    """Connection string of an empty SQLite database with the CAOM tables"""
+
+    connection_string = f"sqlite:///{tmp_path / 'caom.db'}"
+    prepare_database(connection_string)
+    yield connection_string
+    dispose_engines()
+
+
+@pytest.fixture
+def foreign_keys(connection_string):
+    """Enforce foreign keys on the connections of the test database, as PostgreSQL does"""
+
+    engine = load_engine(connection_string)
+    engine.dispose()
+    event.listen(engine, 'connect', lambda dbapi_connection, _: dbapi_connection.execute('PRAGMA foreign_keys=ON'))
+
+
+@pytest.fixture(scope='session')
+def hst_xml() -> bytes:
+    with open(HST_FILE, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def make_observation(hst_xml):
+    """Factory of copies of the bundled HST observation with identifiers unique to an index
+
+    Replacements are (pattern, replacement) regular expression pairs applied to the
+    bundled file before its identifiers change.
+    """
+
+    def make(index: int, *replacements: tuple) -> bytes:
+        text = hst_xml.decode()
+        for old, new in replacements:
+            assert re.search(old, text, re.DOTALL), old
+            text = re.sub(old, new, text, flags=re.DOTALL)
+        text = re.sub(r'caom2:id="([0-9a-f-]{36})"',
+                      lambda m: f'caom2:id="{uuid.uuid5(uuid.UUID(m[1]), str(index))}"', text)
+        return text.replace(HST_ID, f'{HST_ID}_{index}').encode()
+
+    return make
+
+
+@pytest.fixture
+def count_rows(connection_string):
+    """Number of rows of the table of a model in the test database"""
+
+    def count(model: type) -> int:
+        with load_engine(connection_string).connect() as conn:
+            return conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+    return count
+
+
+@pytest.fixture
+def target_names(connection_string):
+    """Target names of the observations in the test database, by observation id"""
+
+    def names() -> list:
+        with load_engine(connection_string).connect() as conn:
+            return conn.execute(select(CaomObservation.target_name)
+                                .order_by(CaomObservation.observation_id)).scalars().all()
+
+    return names
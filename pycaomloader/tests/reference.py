@@ -0,0 +1,187 @@
+"""Reference flattening of CAOM observations with a direct reflective walk
+
+This is the plain vars() walk that flatten.py replaced, extended to artifacts, parts,
+chunks, links and shape bounds. It shares no code with pycaomloader.flatten or
+pycaomloader.geometry so test_flatten can check the compiled plans against it, and
+benchmarks/bench_flatten.py times both.
+"""
+
+# pylint: disable=protected-access
+
+import math
+from enum import Enum
+from typing import Any
+from datetime import datetime
+from caom2.plane import Position, Time, Energy, Metrics, Polarization, CustomAxis
+from caom2.chunk import SpatialWCS, SpectralWCS, TemporalWCS, PolarizationWCS, CustomWCS, ObservableAxis
+from caom2.shape import Point, Circle, Polygon, Interval, SegmentType
+from caom2.wcs import Axis, Coord2D, CoordAxis1D, CoordAxis2D, CoordCircle2D, CoordError, CoordFunction1D, \
+    CoordFunction2D, CoordRange1D, CoordRange2D, Dimension2D, RefCoord, Slice, ValueCoord2D
+
+OBJECT_FIELDS = ('target', 'targetPosition', 'proposal', 'telescope', 'environment', 'instrument',
+                 'provenance', 'position', 'time', 'energy', 'metrics', 'polarization', 'custom')
+OBJECT_TYPES = (Point, Circle, Polygon, Interval, Position, Time, Energy, Metrics, Polarization, CustomAxis)
+
+CHUNK_FIELDS = ('position', 'energy', 'time', 'polarization', 'custom', 'observable')
+CHUNK_TYPES = (SpatialWCS, SpectralWCS, TemporalWCS, PolarizationWCS, CustomWCS, ObservableAxis, Axis, Slice,
+               CoordAxis1D, CoordAxis2D, CoordError, CoordRange1D, CoordRange2D, CoordFunction1D, CoordFunction2D,
+               Coord2D, RefCoord, ValueCoord2D, Dimension2D, CoordCircle2D)
+
+# Objects stored as one of their attributes
+VALUE_PATHS = {'algorithm': ('name',),
+               'requirements': ('flag', 'value'),
+               'intent': ('value',),
+               'calibration_level': ('value',),
+               'data_product_type': ('value',),
+               'product_type': ('value',),
+               'release_type': ('value',)}
+
+RENAMES = {'target_position': 'targetPosition',
+           'position_axis_1': 'positionAxis1',
+           'position_axis_2': 'positionAxis2',
+           'energy_axis': 'energyAxis',
+           'time_axis': 'timeAxis',
+           'polarization_axis': 'polarizationAxis',
+           'observable_axis': 'observableAxis',
+           'custom_axis': 'customAxis'}
+
+
+def unit_vector(ra: float, dec: float) -> tuple:
+    ra, dec = math.radians(ra), math.radians(dec)
+    return math.cos(dec) * math.cos(ra), math.cos(dec) * math.sin(ra), math.sin(dec)
+
+
+def separation(a: tuple, b: tuple) -> float:
+    cross = (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+    return math.degrees(math.atan2(math.sqrt(sum(c * c for c in cross)), sum(x * y for x, y in zip(a, b))))
+
+
+def box_fields(fields: dict, k: str, ra_min: float, ra_max: float, dec_min: float, dec_max: float):
+    if ra_min < 0 or ra_max > 360:
+        ra_min, ra_max = 0., 360.
+    fields.update({k + '_ra_min': ra_min, k + '_ra_max': ra_max, k + '_dec_min': dec_min, k + '_dec_max': dec_max})
+
+
+def shape_fields(fields: dict, k: str, shape: Any):
+    """Text, size and bounding box of polygons and circles, text and limits of intervals"""
+
+    if isinstance(shape, Polygon):
+        fields[k] = 'polygon ' + ' '.join(f'{p.cval1} {p.cval2}' for p in shape.points)
+        if shape.samples is None:
+            fields[k + '_samples'] = None
+        else:
+            polygons, current = [], []
+            for v in shape.samples.vertices:
+                if v.type == SegmentType.CLOSE:
+                    polygons.append('polygon ' + ' '.join(current))
+                    current = []
+                else:
+                    current.append(f'{v.cval1} {v.cval2}')
+            fields[k + '_samples'] = ' | '.join(polygons) or None
+
+        vectors = [unit_vector(p.cval1, p.cval2) for p in shape.points]
+        center = tuple(sum(c) for c in zip(*vectors))
+        fields[k + '_size'] = 2 * max(separation(center, v) for v in vectors)
+
+        ras = [p.cval1 for p in shape.points]
+        decs = [p.cval2 for p in shape.points]
+        if max(ras) - min(ras) > 180:
+            box_fields(fields, k, 0., 360., min(decs), max(decs))
+        else:
+            box_fields(fields, k, min(ras), max(ras), min(decs), max(decs))
+
+    elif isinstance(shape, Circle):
+        ra, dec, r = shape.center.cval1, shape.center.cval2, shape.radius
+        fields[k] = f'circle {ra} {dec} {r}'
+        fields[k + '_size'] = 2 * r
+        if dec - r <= -90 or dec + r >= 90:
+            box_fields(fields, k, 0., 360., max(dec - r, -90.), min(dec + r, 90.))
+        else:
+            ratio = math.sin(math.radians(r)) / math.cos(math.radians(dec))
+            dra = 180. if ratio >= 1 else math.degrees(math.asin(ratio))
+            box_fields(fields, k, ra - dra, ra + dra, dec - r, dec + r)
+
+    else:
+        fields[k] = f'{shape.lower} {shape.upper}'
+        fields[k + '_lower'] = shape.lower
+        fields[k + '_upper'] = shape.upper
+        fields[k + '_width'] = shape.upper - shape.lower
+        if shape.samples:
+            fields[k + '_samples'] = ' | '.join(f'{s.lower} {s.upper}' for s in shape.samples)
+
+
+def nested_fields(fields: dict, k: str, v: Any, types: tuple):
+    """Recursive walk of the attributes of a nested object, stored with prefix k"""
+
+    if v is None:
+        fields[k] = None
+        return
+
+    for k2, v2 in vars(v).items():
+        if k2.endswith('points') or k2.endswith('samples'):
+            continue
+        if k2.endswith('bounds') and isinstance(v2, (Polygon, Circle, Interval)):
+            shape_fields(fields, k + k2, v2)
+        elif k2.endswith('bounds') or isinstance(v2, types):
+            nested_fields(fields, k + k2, v2, types)
+        elif isinstance(v2, Enum):
+            fields[k + k2] = v2.value
+        elif isinstance(v2, (str, int, float, type(None), bool, datetime)):
+            fields[k + k2] = v2
+        elif isinstance(v2, (set, list)):
+            joined = ' | '.join(getattr(x, 'value', x) for x in v2)
+            if joined.strip() != '':
+                fields[k + k2] = joined
+
+
+def object_fields(obj: Any, names: tuple = OBJECT_FIELDS, types: tuple = OBJECT_TYPES) -> dict:
+    fields = {}
+    for k, v in vars(obj).items():
+        k = k[1:] if k.startswith('_') else k
+        k = RENAMES.get(k, k)
+        if k in ('planes', 'artifacts', 'parts', 'chunks', 'members') or k.endswith('read_groups'):
+            continue
+        if k in names:
+            nested_fields(fields, k, v, types)
+        elif k in VALUE_PATHS:
+            for name in VALUE_PATHS[k]:
+                v = getattr(v, name, v)
+            fields[k] = v
+        elif 'checksum' in k.lower() or 'uri' in k.lower():
+            fields[k] = getattr(v, 'uri', v)
+        else:
+            fields[k] = v
+    return fields
+
+
+def reference_observation(obs: Any) -> tuple:
+    """Fields of an observation and its children, in the order of flatten.flatten_observation"""
+
+    observation = object_fields(obs)
+    observation['typeCode'] = 'D' if 'Derived' in type(obs).__name__ or 'Composite' in type(obs).__name__ else 'S'
+    members = [{'obsID': obs._id, 'memberURI': m.uri} for m in getattr(obs, 'members', None) or ()]
+    if members:
+        observation['members'] = ' | '.join(sorted(m['memberURI'] for m in members))
+    obs_groups = [{'obsID': obs._id, 'groupURI': g} for g in obs.meta_read_groups or ()]
+
+    planes, artifacts, parts, chunks, inputs, plane_meta_groups, plane_data_groups = [], [], [], [], [], [], []
+    for plane in obs.planes.values():
+        fields = object_fields(plane)
+        fields['planeURI'] = f'caom:{obs.collection}/{obs.observation_id}/{plane.product_id}'
+        fields['obsID'] = obs._id
+        planes.append(fields)
+        if plane.provenance is not None and plane.provenance.inputs:
+            fields['provenance_inputs'] = ' | '.join(sorted(i.uri for i in plane.provenance.inputs))
+            inputs.extend({'planeID': plane._id, 'inputURI': i.uri} for i in plane.provenance.inputs)
+        plane_meta_groups.extend({'planeID': plane._id, 'groupURI': g} for g in plane.meta_read_groups or ())
+        plane_data_groups.extend({'planeID': plane._id, 'groupURI': g} for g in plane.data_read_groups or ())
+
+        for artifact in plane.artifacts.values():
+            artifacts.append(dict(object_fields(artifact), planeID=plane._id))
+            for part in artifact.parts.values():
+                parts.append(dict(object_fields(part), artifactID=artifact._id))
+                chunks.extend(dict(object_fields(chunk, CHUNK_FIELDS, CHUNK_TYPES), partID=part._id)
+                              for chunk in part.chunks)
+
+    return observation, planes, artifacts, parts, chunks, members, inputs, obs_groups, plane_meta_groups, \
+        plane_data_groups
@@ -0,0 +1,41 @@
+import asyncio
+from collections import Counter
+import pytest
+from pycaomloader.schema import CaomObservation, CaomPlane, CaomArtifact
+from pycaomloader.tests.conftest import NEW_TARGET, NEW_CHECKSUM
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+from pycaomloader.aio import ingest_files_async, load_async_engine  # noqa: E402 pylint: disable=wrong-import-position
+
+
+@pytest.mark.parametrize('writers', [1, 2, 4])
+def test_concurrent_writers(connection_string, make_observation, count_rows, writers):
+    sources = [(f'obs{i}.xml', make_observation(i)) for i in range(200)]
+    summary = asyncio.run(ingest_files_async(sources, connection_string, writers=writers, batch_size=10))
+
+    assert (summary['files'], summary['failed']) == (200, 0)
+    assert count_rows(CaomObservation) == 200
+    assert count_rows(CaomPlane) == 200
+    assert count_rows(CaomArtifact) == 1200
+
+
+def test_concurrent_incremental(connection_string, make_observation, count_rows, target_names):
+    sources = [(f'obs{i}.xml', make_observation(i)) for i in range(200)]
+    asyncio.run(ingest_files_async(sources, connection_string, writers=4, batch_size=10, ledger=True))
+
+    sources = [(f'obs{i}.xml', make_observation(i, *((NEW_TARGET, NEW_CHECKSUM) if i % 2 else ())))
+               for i in range(200)]
+    summary = asyncio.run(ingest_files_async(sources, connection_string, writers=4, batch_size=10,
+                                             incremental=True, ledger=True))
+
+    assert (summary['files'], summary['skipped'], summary['failed']) == (100, 100, 0)
+    assert count_rows(CaomObservation) == 200
+    assert count_rows(CaomArtifact) == 1200
+    assert sorted(Counter(target_names()).items()) == [('NGC6293', 100), ('NGC6294', 100)]
+
+
+def test_in_memory_rejected():
+    with pytest.raises(ValueError, match='In-memory'):
+        load_async_engine('sqlite://')
@@ -0,0 +1,95 @@
+import io
+import sys
+import tarfile
+from types import SimpleNamespace
+import pytest
+from pycaomloader.cli import build_parser, main
+from pycaomloader.schema import CaomObservation, CaomPlane
+from pycaomloader.tests.conftest import DECLARATION
+
+
+def write_files(directory, make_observation, n: int = 3) -> list:
+    directory.mkdir()
+    paths = []
+    for i in range(n):
+        paths.append(directory / f'obs{i}.xml')
+        paths[-1].write_bytes(make_observation(i))
+    return paths
+
+
+def concatenated(make_observation, n: int = 3) -> bytes:
+    return b''.join(DECLARATION + make_observation(i) + b'\n' for i in range(n))
+
+
+def test_init(connection_string, make_observation, count_rows, tmp_path):
+    write_files(tmp_path / 'xml', make_observation)
+    assert main(['ingest', '--db', connection_string, str(tmp_path / 'xml')]) == 0
+    assert count_rows(CaomObservation) == 3
+
+    assert main(['init', '--db', connection_string, '--drop']) == 0
+    assert count_rows(CaomObservation) == 0
+    assert count_rows(CaomPlane) == 0
+
+
+def test_ingest_directory(connection_string, make_observation, count_rows, tmp_path, capsys):
+    write_files(tmp_path / 'xml', make_observation)
+    assert main(['ingest', '--db', connection_string, '-w', '2', '-b', '2', '--backend', 'orm',
+                 str(tmp_path / 'xml')]) == 0
+    assert count_rows(CaomObservation) == 3
+    assert capsys.readouterr().out.startswith('3 files loaded, 0 failed, 0 skipped')
+
+    # Unchanged observations are skipped
+    assert main(['ingest', '--db', connection_string, '--incremental', str(tmp_path / 'xml')]) == 0
+    assert capsys.readouterr().out.startswith('0 files loaded, 0 failed, 3 skipped')
+
+
+def test_ingest_archive(connection_string, make_observation, count_rows, tmp_path):
+    path = tmp_path / 'obs.tar.gz'
+    with tarfile.open(path, 'w:gz') as tar:
+        for i in range(3):
+            content = make_observation(i)
+            info = tarfile.TarInfo(f'obs{i}.xml')
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    assert main(['ingest', '--db', connection_string, '--ledger', str(path)]) == 0
+    assert count_rows(CaomObservation) == 3
+
+
+def test_ingest_concatenated(connection_string, make_observation, count_rows, tmp_path):
+    path = tmp_path / 'dump.xml'
+    path.write_bytes(concatenated(make_observation))
+    assert main(['ingest', '--db', connection_string, str(path)]) == 0
+    assert count_rows(CaomObservation) == 3
+
+
+def test_ingest_stdin(connection_string, make_observation, count_rows, monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', SimpleNamespace(buffer=io.BytesIO(concatenated(make_observation))))
+    assert main(['ingest', '--db', connection_string, '--validate', 'all', '-']) == 0
+    assert count_rows(CaomObservation) == 3
+
+
+def test_failed_exit_status(connection_string, make_observation, count_rows, tmp_path, capsys):
+    paths = write_files(tmp_path / 'xml', make_observation)
+    paths[1].write_bytes(b'<notxml')
+    assert main(['ingest', '--db', connection_string, str(tmp_path / 'xml')]) == 1
+    assert count_rows(CaomObservation) == 2
+    assert capsys.readouterr().out.startswith('2 files loaded, 1 failed')
+
+
+def test_missing_database(monkeypatch, tmp_path):
+    monkeypatch.delenv('PYCAOMLOADER_DB', raising=False)
+    assert main(['ingest', str(tmp_path)]) == 2
+
+
+@pytest.mark.parametrize('value, expected', [('all', True), ('none', False), ('0.25', 0.25), ('1', 1.0)])
+def test_validate(value, expected):
+    args = build_parser().parse_args(['ingest', '--validate', value, 'obs.xml'])
+    assert args.validate == expected
+
+
+@pytest.mark.parametrize('value', ['2', '-0.5', 'some'])
+def test_validate_invalid(value):
+    with pytest.raises(SystemExit) as e:
+        build_parser().parse_args(['ingest', '--validate', value, 'obs.xml'])
+    assert e.value.code == 2
@@ -0,0 +1,66 @@
+# pylint: disable=protected-access
+
+import uuid
+from datetime import datetime
+import pytest
+from pycaomloader.schema import CaomObservation, CaomPlane
+from pycaomloader.load import ingest_files
+
+pa_dataset = pytest.importorskip('pyarrow.dataset')
+
+from pycaomloader.export import ParquetExporter, export_database, export_files  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_bounded_buffers(tmp_path):
+    # Interleaved rows of 2 collections over 24 monthly partitions
+    rows = [{'obsID': uuid.uuid4(), 'observationID': f'obs{i}', 'collection': ('HST', 'JWST')[i % 2],
+             'metaRelease': datetime(2009 + i // 12 % 2, i % 12 + 1, 1)} for i in range(240)]
+
+    with ParquetExporter(str(tmp_path), CaomObservation, batch_size=20, max_rows=30, max_open=4) as exporter:
+        for row in rows:
+            exporter.write(dict(row))
+            assert exporter._buffered <= exporter.max_rows
+            assert len(exporter._writers) <= exporter.max_open
+    assert exporter.rows == len(rows)
+
+    table = pa_dataset.dataset(str(tmp_path / 'Observation'), partitioning='hive').to_table()
+    assert sorted(table.column('observationID').to_pylist()) == sorted(row['observationID'] for row in rows)
+    assert sorted(table.column('obsID').to_pylist()) == sorted(str(row['obsID']) for row in rows)
+
+    exported = set(zip(table.column('collection').to_pylist(), table.column('release_date').to_pylist(),
+                       table.column('observationID').to_pylist()))
+    assert exported == {(row['collection'], row['metaRelease'].strftime('%Y-%m'), row['observationID'])
+                        for row in rows}
+
+
+RELEASES = [f'2009-{month:02d}-20T16:17:12.612' for month in range(1, 13)]
+
+
+def monthly_sources(make_observation) -> list:
+    return [(f'obs{i}.xml', make_observation(i, ('2009-04-20T16:17:12.612', RELEASES[i % 12]))) for i in range(36)]
+
+
+def test_export_database(tmp_path, connection_string, make_observation):
+    ingest_files(monthly_sources(make_observation), connection_string)
+
+    # Rows come ordered by partition, so a single open file is enough for one file per partition
+    counts = export_database(connection_string, str(tmp_path), batch_size=10, max_rows=5, max_open=1)
+    assert counts == {CaomObservation.__tablename__: 36, CaomPlane.__tablename__: 36}
+
+    for model in (CaomObservation, CaomPlane):
+        files = sorted(p.relative_to(tmp_path / model.__tablename__).as_posix()
+                       for p in (tmp_path / model.__tablename__).rglob('*.parquet'))
+        assert files == [f'collection=HST/release_date={r[:7]}/part-0.parquet' for r in RELEASES]
+
+
+def test_export_files(tmp_path, make_observation):
+    sources = monthly_sources(make_observation)
+
+    counts = export_files(sources, str(tmp_path), batch_size=10, max_rows=5, max_open=3)
+    assert counts == {'failed': 0, CaomObservation.__tablename__: 36, CaomPlane.__tablename__: 36}
+
+    for model in (CaomObservation, CaomPlane):
+        table = pa_dataset.dataset(str(tmp_path / model.__tablename__), partitioning='hive').to_table()
+        assert table.num_rows == 36
+        assert set(table.column('collection').to_pylist()) == {'HST'}
+        assert sorted(set(table.column('release_date').to_pylist())) == [r[:7] for r in RELEASES]
@@ -0,0 +1,38 @@
+"""The compiled flattening plans must give the same fields as the reflective walk of reference.py"""
+
+import os
+import glob
+import pytest
+from caom2.obs_reader_writer import ObservationReader
+from pycaomloader.flatten import flatten_observation
+from pycaomloader.tests.conftest import HST_FILE, CAOM2_DATA
+from pycaomloader.tests.reference import reference_observation
+
+# The bundled HST observation and the samples shipped with caom2
+SAMPLE_FILES = [HST_FILE] + sorted(glob.glob(os.path.join(CAOM2_DATA, '*.xml')))
+
+
+def assert_same_fields(fields: dict, expected: dict):
+    assert fields.keys() == expected.keys()
+    for k, v in expected.items():
+        # Sizes are computed with different formulas
+        assert fields[k] == (pytest.approx(v) if isinstance(v, float) else v), k
+
+
+@pytest.mark.parametrize('path', SAMPLE_FILES, ids=os.path.basename)
+def test_compiled_matches_reference(path):
+    obs = ObservationReader().read(path)
+    compiled, reference = flatten_observation(obs), reference_observation(obs)
+
+    assert_same_fields(compiled[0], reference[0])
+    assert len(compiled) == len(reference)
+    for rows, expected in zip(compiled[1:], reference[1:]):
+        assert len(rows) == len(expected)
+        for row, expected_row in zip(rows, expected):
+            assert_same_fields(row, expected_row)
+
+
+def test_enum_values():
+    fields = flatten_observation(ObservationReader().read(HST_FILE))[0]
+    assert fields['target_type'] == 'field'
+    assert fields['intent'] == 'science'
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import select
+from pycaomloader.geometry import cone_condition, interval_condition
+from pycaomloader.load import load_engine, ingest_files
+from pycaomloader.schema import CaomPlane
+from pycaomloader.tests.conftest import HST_FILE
+
+PRODUCT_ID = 'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a-CALIBRATED'
+
+# Time and position bounds of the bundled plane
+TIME_UPPER = 54941.6786182
+RA_MAX, DEC_MIN, DEC_MAX = 257.5833056978569, -26.611695228075003, -26.553477530489683
+
+
+@pytest.fixture
+def planes(connection_string):
+    """Product ids of the planes of the bundled observation matching a condition"""
+
+    ingest_files([HST_FILE], connection_string)
+    engine = load_engine(connection_string)
+
+    def find(condition) -> list:
+        with engine.connect() as conn:
+            return conn.execute(select(CaomPlane.product_id).where(condition)).scalars().all()
+
+    return find
+
+
+def test_interval_exact(planes):
+    assert planes(interval_condition('sqlite', 'time', TIME_UPPER - .001, TIME_UPPER + 1)) == [PRODUCT_ID]
+    # Within the 32 bit rounding of the R*Tree, which stores an upper limit of 54941.6796875
+    assert planes(interval_condition('sqlite', 'time', TIME_UPPER + .0005, TIME_UPPER + 1)) == []
+
+
+def test_cone_exact(planes):
+    dec = (DEC_MIN + DEC_MAX) / 2
+    assert planes(cone_condition('sqlite', RA_MAX, dec, 1e-6)) == [PRODUCT_ID]
+    # The R*Tree stores an RA maximum of 257.58331298828125
+    assert planes(cone_condition('sqlite', RA_MAX + 4e-6, dec, 1e-6)) == []
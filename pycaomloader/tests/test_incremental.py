@@ -0,0 +1,60 @@
+from sqlalchemy import select
+from pycaomloader.load import load_engine, ingest_files
+from pycaomloader.schema import CaomObservation, CaomPlane, CaomArtifact, CaomObservationMember
+from pycaomloader.tests.conftest import NEW_TARGET, NEW_CHECKSUM, NO_CHECKSUM, NO_PREVIEW, NO_MEMBERS
+
+
+def sources(make_observation, changes: dict = None) -> list:
+    changes = changes or {}
+    return [(f'obs{i}.xml', make_observation(i, *changes.get(i, ()))) for i in range(3)]
+
+
+def test_unchanged_skipped(connection_string, make_observation, count_rows, target_names):
+    summary = ingest_files(sources(make_observation), connection_string, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (3, 0, 0)
+
+    # Same accMetaChecksum, the stored observation is kept even if the content differs
+    summary = ingest_files(sources(make_observation, {1: [NEW_TARGET]}), connection_string, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (0, 3, 0)
+    assert target_names() == ['NGC6293'] * 3
+
+    assert count_rows(CaomObservation) == 3
+    assert count_rows(CaomPlane) == 3
+    assert count_rows(CaomArtifact) == 18
+    assert count_rows(CaomObservationMember) == 3
+
+
+def test_changed_replaced(connection_string, make_observation, count_rows, target_names):
+    ingest_files(sources(make_observation), connection_string, incremental=True)
+
+    changes = {1: [NEW_TARGET, NEW_CHECKSUM, NO_PREVIEW, NO_MEMBERS]}
+    summary = ingest_files(sources(make_observation, changes), connection_string, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (1, 2, 0)
+    assert target_names() == ['NGC6293', 'NGC6294', 'NGC6293']
+
+    # Children the observation no longer has are deleted, through the plane for artifacts
+    assert count_rows(CaomObservation) == 3
+    assert count_rows(CaomPlane) == 3
+    assert count_rows(CaomArtifact) == 17
+    assert count_rows(CaomObservationMember) == 2
+
+    with load_engine(connection_string).connect() as conn:
+        checksum = conn.execute(select(CaomObservation.acc_meta_checksum)
+                                .where(CaomObservation.target_name == 'NGC6294')).scalar_one()
+        uris = conn.execute(select(CaomArtifact.uri).join(CaomArtifact.plane).join(CaomPlane.observation)
+                            .where(CaomObservation.target_name == 'NGC6294')).scalars().all()
+    assert checksum == 'md5:00000000000000000000000000000001'
+    assert len(uris) == 5
+    assert not any(uri.endswith('_drz.jpg') for uri in uris)
+
+
+def test_missing_checksum_rewritten(connection_string, make_observation, count_rows, target_names):
+    changes = {0: [NO_CHECKSUM]}
+    ingest_files(sources(make_observation, changes), connection_string, incremental=True)
+
+    changes = {0: [NO_CHECKSUM, NEW_TARGET]}
+    summary = ingest_files(sources(make_observation, changes), connection_string, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (1, 2, 0)
+    assert target_names() == ['NGC6294', 'NGC6293', 'NGC6293']
+    assert count_rows(CaomObservation) == 3
+    assert count_rows(CaomArtifact) == 18
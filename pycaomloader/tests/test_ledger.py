@@ -0,0 +1,61 @@
+import io
+import os
+import tarfile
+from sqlalchemy import select
+from pycaomloader.ledger import COMMITTED
+from pycaomloader.load import load_engine, ingest_archive, ingest_files
+from pycaomloader.schema import IngestLedger
+from pycaomloader.tests.conftest import NEW_TARGET, NEW_CHECKSUM
+
+
+def write_tar(path, members: dict):
+    with tarfile.open(path, 'w') as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+def test_resume_archive(tmp_path, connection_string, make_observation, target_names):
+    path = tmp_path / 'obs.tar'
+    members = {f'obs{i}.xml': make_observation(i) for i in range(3)}
+    write_tar(path, members)
+    summary = ingest_archive(str(path), connection_string, ledger=True)
+    assert (summary['files'], summary['skipped']) == (3, 0)
+
+    summary = ingest_archive(str(path), connection_string, resume=True)
+    assert (summary['files'], summary['skipped']) == (0, 3)
+
+    # A member rewritten with content of the same length is loaded again
+    members['obs1.xml'] = make_observation(1, NEW_TARGET, NEW_CHECKSUM)
+    assert len(members['obs1.xml']) == len(make_observation(1))
+    write_tar(path, members)
+    summary = ingest_archive(str(path), connection_string, resume=True, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (1, 2, 0)
+    assert target_names() == ['NGC6293', 'NGC6294', 'NGC6293']
+
+    with load_engine(connection_string).connect() as conn:
+        statuses = conn.execute(select(IngestLedger.status)).scalars().all()
+    assert statuses == [COMMITTED] * 3
+
+
+def test_resume_files(tmp_path, connection_string, make_observation, target_names):
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f'obs{i}.xml'))
+        with open(paths[-1], 'wb') as f:
+            f.write(make_observation(i))
+    summary = ingest_files(paths, connection_string, ledger=True)
+    assert (summary['files'], summary['skipped']) == (3, 0)
+
+    summary = ingest_files(paths, connection_string, resume=True)
+    assert (summary['files'], summary['skipped']) == (0, 3)
+
+    # Local files are compared by size and mtime
+    with open(paths[2], 'wb') as f:
+        f.write(make_observation(2, NEW_TARGET, NEW_CHECKSUM))
+    stat = os.stat(paths[2])
+    os.utime(paths[2], (stat.st_atime, stat.st_mtime + 10))
+    summary = ingest_files(paths, connection_string, resume=True, incremental=True)
+    assert (summary['files'], summary['skipped'], summary['failed']) == (1, 2, 0)
+    assert target_names() == ['NGC6293', 'NGC6293', 'NGC6294']
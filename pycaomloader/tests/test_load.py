@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import pytest
+from sqlalchemy import select
+from pycaomloader.load import load_engine, prepare_database, ingest_files, dispose_engines
+from pycaomloader.schema import CaomObservation, CaomPlane, CaomObservationMember, CaomProvenanceInput, \
+    CaomObservationMetaReadGroup, CaomPlaneMetaReadGroup, CaomPlaneDataReadGroup
+from pycaomloader.tests.conftest import HST_FILE, CAOM2_DATA
+
+# Derived observation with members, provenance inputs and read groups
+SAMPLE_DERIVED = os.path.join(CAOM2_DATA, 'SampleDerived-CAOM-2.4.xml')
+
+
+class Connection(sqlite3.Connection):
+    pass
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    """In-memory SQLite connection string, with a temporary working directory"""
+
+    monkeypatch.chdir(tmp_path)
+    yield 'sqlite://'
+    dispose_engines()
+
+
+def test_engine_cache(connection_string):
+    engine = load_engine(connection_string)
+    assert load_engine(connection_string) is engine
+    assert load_engine(connection_string, pool_size=2) is not engine
+
+    # Unhashable arguments
+    engine = load_engine(connection_string, connect_args={'timeout': 10}, execution_options={'foo': 'bar'})
+    assert load_engine(connection_string, execution_options={'foo': 'bar'}, connect_args={'timeout': 10}) is engine
+    assert load_engine(connection_string, connect_args={'timeout': 20}) is not engine
+
+    dispose_engines()
+    assert load_engine(connection_string) is not engine
+
+
+def test_connect_args(connection_string):
+    engine = load_engine(connection_string, connect_args={'factory': Connection})
+    with engine.connect() as conn:
+        assert isinstance(conn.connection.dbapi_connection, Connection)
+
+        # check_same_thread is still turned off
+        results = []
+        thread = threading.Thread(target=lambda: results.append(conn.exec_driver_sql('SELECT 1').scalar()))
+        thread.start()
+        thread.join()
+        assert results == [1]
+
+
+def test_pragmas(connection_string):
+    with load_engine(connection_string).connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA caom2.journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA caom2.synchronous').scalar() == 1
+        assert conn.exec_driver_sql('PRAGMA caom2.cache_size').scalar() == -64000
+        # Not the in-memory main database
+        assert conn.exec_driver_sql('PRAGMA main.cache_size').scalar() != -64000
+
+
+def test_in_memory(memory, tmp_path):
+    prepare_database(memory)
+    summary = ingest_files([HST_FILE], memory)
+    assert (summary['files'], summary['failed']) == (1, 0)
+
+    with load_engine(memory).connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM caom2."Observation"').scalar() == 1
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM caom2."Plane"').scalar() == 1
+        databases = {name: file for _, name, file in conn.exec_driver_sql('PRAGMA database_list')}
+    assert databases['caom2'] == ''
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('backend', ['orm', 'core', 'upsert'])
+def test_links(connection_string, foreign_keys, count_rows, backend):
+    summary = ingest_files([SAMPLE_DERIVED], connection_string, backend=backend)
+    assert (summary['files'], summary['failed']) == (1, 0)
+    assert count_rows(CaomObservationMember) == 2
+    assert count_rows(CaomProvenanceInput) == 4
+    assert count_rows(CaomObservationMetaReadGroup) == 2
+    assert count_rows(CaomPlaneMetaReadGroup) == 4
+    assert count_rows(CaomPlaneDataReadGroup) == 4
+
+    # Also stored joined
+    with load_engine(connection_string).connect() as conn:
+        assert conn.execute(select(CaomObservation.members)).scalar_one() == 'caom:foo/bar | caom:foo/baz'
+        assert conn.execute(select(CaomPlane.provenance_inputs)).scalars().all() == \
+            ['caom:foo/bar/plane1 | caom:foo/bar/plane2'] * 2
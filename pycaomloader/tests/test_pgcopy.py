@@ -0,0 +1,113 @@
+import os
+from types import SimpleNamespace
+from datetime import datetime
+from uuid import UUID
+import pytest
+from pycaomloader.pgcopy import format_value, CopyStream, copy_statement, copy_rows
+from pycaomloader.load import MODELS, parse_file, write_copy
+from pycaomloader.schema import CaomObservation, CaomPlane
+
+HST_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a.xml')
+
+
+class FakeCursor:
+    """Stand-in for a psycopg2 cursor recording what copy_expert reads, 8 kB at a time like psycopg2"""
+
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, file, size=8192):
+        chunks = []
+        while chunk := file.read(size):
+            chunks.append(chunk)
+        self.copies.append((sql, ''.join(chunks)))
+
+
+def fake_session(cursor: FakeCursor) -> SimpleNamespace:
+    """Stand-in for a Session whose raw driver connection hands out cursor"""
+
+    dbapi_connection = SimpleNamespace(cursor=lambda: cursor)
+    return SimpleNamespace(connection=lambda: SimpleNamespace(connection=dbapi_connection))
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, '\\N'),
+    (True, 't'),
+    (False, 'f'),
+    (0, '0'),
+    (1.5, '1.5'),
+    (datetime(2009, 4, 20, 16, 17, 12, 612000), '2009-04-20 16:17:12.612000'),
+    (UUID('6c50efa2-9bc6-4c80-8392-40b14d62adef'), '6c50efa2-9bc6-4c80-8392-40b14d62adef'),
+    ('plain', 'plain'),
+    ('a\tb', 'a\\tb'),
+    ('a\nb\rc', 'a\\nb\\rc'),
+    ('C:\\data', 'C:\\\\data'),
+    ('\\N', '\\\\N'),
+])
+def test_format_value(value, expected):
+    assert format_value(value) == expected
+
+
+def test_copy_stream():
+    rows = [(1, 'a\tb', None), (2, 'line\nbreak', True)]
+    expected = '1\ta\\tb\t\\N\n2\tline\\nbreak\tt\n'
+
+    assert CopyStream(rows).read() == expected
+
+    # Small reads must reassemble the same text
+    stream = CopyStream(rows)
+    chunks = []
+    while chunk := stream.read(3):
+        assert len(chunk) <= 3
+        chunks.append(chunk)
+    assert ''.join(chunks) == expected
+
+    stream = CopyStream(rows)
+    assert stream.readline() == '1\ta\\tb\t\\N\n'
+    assert stream.readline() == '2\tline\\nbreak\tt\n'
+    assert stream.readline() == ''
+
+
+def test_copy_statement():
+    table = CaomPlane.__table__
+    sql = copy_statement(table)
+    assert sql.startswith('COPY caom2."Plane" (')
+    assert sql.endswith(') FROM STDIN')
+    listed = sql[sql.index('(') + 1:sql.rindex(')')].split(', ')
+    assert listed == [f'"{c.name}"' for c in table.columns]
+
+
+def test_copy_rows():
+    cursor = FakeCursor()
+    copy_rows(cursor, CaomObservation.__table__, [])
+    assert cursor.copies == [(copy_statement(CaomObservation.__table__), '')]
+
+
+def test_write_copy():
+    rows = parse_file(HST_FILE)
+    cursor = FakeCursor()
+    write_copy(fake_session(cursor), [rows, rows])
+
+    # One COPY per table, parents first, listing columns in metadata order
+    assert [sql for sql, _ in cursor.copies] == [copy_statement(model.__table__) for model in MODELS]
+
+    for index, (model, (_, text)) in enumerate(zip(MODELS, cursor.copies)):
+        expected = [rows[0]] if index == 0 else rows[index]
+        lines = text.split('\n')
+        assert lines.pop() == ''
+        assert len(lines) == 2 * len(expected)
+        for line, row in zip(lines, expected * 2):
+            fields = line.split('\t')
+            assert len(fields) == len(model.__table__.columns)
+            assert fields == [format_value(v) for v in row]
+
+    # Values land under their own columns
+    columns = [c.name for c in CaomObservation.__table__.columns]
+    fields = cursor.copies[0][1].split('\n')[0].split('\t')
+    values = dict(zip(columns, fields))
+    assert values['obsID'] == '6c50efa2-9bc6-4c80-8392-40b14d62adef'
+    assert values['collection'] == 'HST'
+    assert values['observationID'] == 'hst_11975_39_wfpc2_wfpc2_f170w_ubai390a'
+    assert values['metaRelease'] == '2009-04-20 16:17:12.612000'
+    assert values['environment_photometric'] == 't'
+    assert values['proposal_id'] == '11975'
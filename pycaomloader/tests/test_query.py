@@ -0,0 +1,240 @@
+"""Searches of query.py compared with brute force filters of the loaded rows"""
+
+import os
+import re
+import math
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from pycaomloader.load import load_engine, ingest_files
+from pycaomloader.query import search_observations, search_planes
+from pycaomloader.schema import CaomObservation, CaomPlane, CaomObservationMember, CaomProvenanceInput
+from pycaomloader.tests.conftest import HST_FILE, CAOM2_DATA
+
+SAMPLE_FILES = [HST_FILE] + [os.path.join(CAOM2_DATA, name) for name in (
+    'CompleteCompositePolygon-CAOM-2.3.xml', 'SampleComposite-CAOM-2.3.xml', 'SampleDerived-CAOM-2.4.xml',
+    'SampleSimple-CAOM-2.3.xml', 'diff-actual-CAOM-2.3.xml', 'diff-actual-CAOM-2.4.xml')]
+
+TIME_RANGES = [(50000., 50000.3), (50000.8, 50001.), (50141.7, 58979.6), (54941., 54942.), (0., 50141.733), (0., 1.)]
+ENERGY_RANGES = [(5e-4, 6e-4), (6e-7, 7e-7), (0., 0.), (.2175, .2176), (1e-7, 2e-7), (1., 2.)]
+CONES = [(2., 3., .5), (359.5, 3.5, 1.6), (188.1, 14.3, .05), (274.7, 33., .2), (153.2, -29.2, .01),
+         (257.55, -26.58, .1), (0., 89.5, 1.), (100., 0., 1.)]
+# Read groups of the SampleDerived observation and planes
+META_GROUP, DATA_GROUP = 'ivo://cadc.nrc.ca/gms?A', 'ivo://cadc.nrc.ca/gms?C'
+
+RELEASES = [(datetime(2017, 1, 1), None), (None, datetime(2020, 1, 1)), (datetime(2019, 5, 10), datetime(2021, 6, 1)),
+            (datetime(2030, 1, 1), None)]
+
+
+def overlaps(lower, upper, value_range: tuple) -> bool:
+    start, end = value_range
+    return lower is not None and (start is None or upper >= start) and (end is None or lower <= end)
+
+
+def within(value, value_range: tuple) -> bool:
+    start, end = value_range
+    return value is not None and (start is None or value >= start) and (end is None or value <= end)
+
+
+def near(plane: CaomPlane, cone: tuple) -> bool:
+    """Whether the position bounding box of a plane overlaps the bounding box of a cone"""
+
+    ra, dec, radius = cone
+    if plane.position_bounds_ra_min is None:
+        return False
+    if not overlaps(plane.position_bounds_dec_min, plane.position_bounds_dec_max, (dec - radius, dec + radius)):
+        return False
+    if abs(dec) + radius >= 90:
+        return True
+    half_width = math.degrees(math.asin(min(1., math.sin(math.radians(radius)) / math.cos(math.radians(dec)))))
+    return any(overlaps(plane.position_bounds_ra_min + shift, plane.position_bounds_ra_max + shift,
+                        (ra - half_width, ra + half_width)) for shift in (-360, 0, 360))
+
+
+@pytest.fixture
+def session(connection_string):
+    summary = ingest_files(SAMPLE_FILES, connection_string)
+    assert (summary['files'], summary['failed']) == (len(SAMPLE_FILES), 0)
+
+    with Session(load_engine(connection_string)) as session:
+        yield session
+
+
+@pytest.fixture
+def planes(session) -> list:
+    return session.scalars(select(CaomPlane)).all()
+
+
+def plane_ids(results) -> set:
+    return {plane.id for plane in results}
+
+
+def observation_ids(planes: list) -> set:
+    return {plane.obsID for plane in planes}
+
+
+@pytest.mark.parametrize('time_range', TIME_RANGES)
+def test_time(session, planes, time_range):
+    expected = [p for p in planes if overlaps(p.time_bounds_lower, p.time_bounds_upper, time_range)]
+    assert plane_ids(search_planes(session, time_range=time_range)) == plane_ids(expected)
+    assert plane_ids(search_observations(session, time_range=time_range)) == observation_ids(expected)
+
+
+@pytest.mark.parametrize('energy_range', ENERGY_RANGES)
+def test_energy(session, planes, energy_range):
+    expected = [p for p in planes if overlaps(p.energy_bounds_lower, p.energy_bounds_upper, energy_range)]
+    assert plane_ids(search_planes(session, energy_range=energy_range)) == plane_ids(expected)
+    assert plane_ids(search_observations(session, energy_range=energy_range)) == observation_ids(expected)
+
+
+@pytest.mark.parametrize('cone', CONES)
+def test_cone(session, planes, cone):
+    expected = [p for p in planes if near(p, cone)]
+    assert plane_ids(search_planes(session, cone=cone)) == plane_ids(expected)
+    assert plane_ids(search_observations(session, cone=cone)) == observation_ids(expected)
+
+
+def test_filters_found_planes(session, planes):
+    # The brute force comparisons above are not all empty
+    for ranges, match in ((TIME_RANGES, lambda p, r: overlaps(p.time_bounds_lower, p.time_bounds_upper, r)),
+                          (ENERGY_RANGES, lambda p, r: overlaps(p.energy_bounds_lower, p.energy_bounds_upper, r)),
+                          (CONES, near)):
+        counts = [sum(match(p, r) for p in planes) for r in ranges]
+        assert 0 in counts and any(0 < n < len(planes) for n in counts), counts
+
+
+@pytest.mark.parametrize('release', RELEASES)
+def test_release(session, planes, release):
+    expected = [p for p in planes if within(p.data_release, release)]
+    assert plane_ids(search_planes(session, data_release=release)) == plane_ids(expected)
+
+    expected = [p for p in planes if within(p.meta_release, release)]
+    assert plane_ids(search_planes(session, meta_release=release)) == plane_ids(expected)
+
+    observations = session.scalars(select(CaomObservation)).all()
+    expected = {o.id for o in observations if within(o.meta_release, release)}
+    assert {o.id for o in search_observations(session, meta_release=release)} == expected
+
+
+def test_member(session):
+    members = session.execute(select(CaomObservationMember.obsID, CaomObservationMember.memberURI)).all()
+    uris = sorted({uri for _, uri in members})
+    assert len(uris) > 1
+
+    for uri in uris + [uris, 'caom:foo/none']:
+        expected = {obs_id for obs_id, member in members if member in ([uri] if isinstance(uri, str) else uri)}
+        assert {o.id for o in search_observations(session, member=uri)} == expected
+
+
+def test_provenance_input(session):
+    inputs = session.execute(select(CaomProvenanceInput.planeID, CaomProvenanceInput.inputURI)).all()
+    uris = sorted({uri for _, uri in inputs})
+    assert len(uris) > 1
+
+    for uri in uris + [uris, 'caom:foo/bar/none']:
+        expected = {plane_id for plane_id, input_uri in inputs
+                    if input_uri in ([uri] if isinstance(uri, str) else uri)}
+        assert plane_ids(search_planes(session, provenance_input=uri)) == expected
+
+
+def test_combined(session, planes):
+    time_range, cone = (50000., 60000.), (274.7, 33., .2)
+    expected = [p for p in planes if p.observation.collection == 'DAO' and near(p, cone)
+                and overlaps(p.time_bounds_lower, p.time_bounds_upper, time_range)]
+    assert expected
+    assert plane_ids(search_planes(session, collection='DAO', time_range=time_range, cone=cone)) == plane_ids(expected)
+
+
+def test_columns(session, planes):
+    rows = search_planes(session, columns=['product_id', 'planeURI', CaomObservation.collection],
+                         energy_range=(0., 1.))
+    expected = {(p.product_id, p.planeURI, p.observation.collection) for p in planes
+                if overlaps(p.energy_bounds_lower, p.energy_bounds_upper, (0., 1.))}
+    assert {tuple(row) for row in rows} == expected
+
+    rows = search_observations(session, columns=[CaomObservation.collection, 'observation_id'])
+    observations = session.scalars(select(CaomObservation)).all()
+    assert sorted(tuple(row) for row in rows) == sorted((o.collection, o.observation_id) for o in observations)
+
+
+def test_yield_per(session, planes):
+    options = []
+    event.listen(session, 'do_orm_execute', lambda state: options.append(state.execution_options.get('yield_per')))
+
+    results = search_planes(session, yield_per=2)
+    assert options == []
+    assert plane_ids(results) == plane_ids(planes)
+    assert options == [2]
+
+    assert len(list(search_observations(session, yield_per=1, columns=['id']))) == len(observation_ids(planes))
+    assert options == [2, 1]
+
+
+@pytest.fixture
+def released(connection_string):
+    """Session on the SampleDerived observation with its metadata and data released at the given UTC times"""
+
+    sessions = []
+
+    def load(meta_release: datetime, data_release: datetime) -> Session:
+        with open(os.path.join(CAOM2_DATA, 'SampleDerived-CAOM-2.4.xml'), 'rb') as f:
+            xml = f.read()
+        for name, release in (b'metaRelease', meta_release), (b'dataRelease', data_release):
+            xml = re.sub(rb'<caom2:%s>[^<]*<' % name,
+                         b'<caom2:%s>%s<' % (name, release.isoformat(timespec='milliseconds').encode()), xml)
+        assert ingest_files([('derived.xml', xml)], connection_string)['failed'] == 0
+
+        sessions.append(Session(load_engine(connection_string)))
+        return sessions[-1]
+
+    yield load
+    for session in sessions:
+        session.close()
+
+
+@pytest.fixture(params=['Etc/GMT+8', 'Etc/GMT-8'])
+def local_time_zone(request):
+    """Local time 8 hours behind, or ahead of, UTC"""
+
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = request.param
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+
+def test_readable_by(released):
+    session = released(datetime(2100, 1, 1), datetime(2100, 1, 1))
+
+    # Anonymous access
+    assert list(search_observations(session, readable_by=[])) == []
+    assert list(search_planes(session, readable_by=[])) == []
+    assert list(search_planes(session, data_readable_by=[])) == []
+
+    # Granted by a metadata or data read group
+    assert len(list(search_observations(session, readable_by=[META_GROUP]))) == 1
+    assert len(list(search_planes(session, readable_by=['ivo://other', META_GROUP]))) == 2
+    assert len(list(search_planes(session, data_readable_by=[DATA_GROUP]))) == 2
+    assert len(list(search_planes(session, readable_by=[META_GROUP], data_readable_by=[DATA_GROUP]))) == 2
+
+    # The groups of one do not grant the other
+    assert list(search_observations(session, readable_by=[DATA_GROUP])) == []
+    assert list(search_planes(session, readable_by=[DATA_GROUP])) == []
+    assert list(search_planes(session, data_readable_by=[META_GROUP])) == []
+
+
+@pytest.mark.parametrize('hours', [-1, 1])
+def test_released_in_utc(released, local_time_zone, hours):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    session = released(now + timedelta(hours=hours), now + timedelta(hours=hours))
+
+    expected = 1 if hours < 0 else 0
+    assert len(list(search_observations(session, readable_by=[]))) == expected
+    assert len(list(search_planes(session, readable_by=[]))) == 2 * expected
+    assert len(list(search_planes(session, data_readable_by=[]))) == 2 * expected
@@ -0,0 +1,72 @@
+import io
+import gzip
+import pytest
+from lxml import etree
+from pycaomloader.load import read_observation, should_validate, parse_files
+from pycaomloader.sources import _ROOT_TAG, iter_elements, iter_stream
+from pycaomloader.tests.conftest import HST_ID, DECLARATION
+
+# Out of order elements, read fine but rejected by the XSD
+NOT_VALID = (r'<caom2:type>EXT</caom2:type><caom2:intent>science</caom2:intent>',
+             '<caom2:intent>science</caom2:intent><caom2:type>EXT</caom2:type>')
+
+
+def wrapped(make_observation, n: int) -> bytes:
+    """Document of n observations inside a root element of another namespace"""
+
+    return DECLARATION + b'<!-- dump --><dump:observations xmlns:dump="urn:dump">\n' + \
+        b'\n'.join(make_observation(i) for i in range(n)) + b'\n</dump:observations>\n'
+
+
+@pytest.mark.parametrize('head, tag', [(b'<caom2:Observation xmlns:caom2="x">', b'Observation'),
+                                       (DECLARATION + b'<!-- <Observation> --><Observation>', b'Observation'),
+                                       (DECLARATION + b'<dump:observations xmlns:dump="urn:dump">', b'observations'),
+                                       (b'\n  <a.b-c:root-list>', b'root-list')])
+def test_root_tag(head, tag):
+    assert _ROOT_TAG.search(head).group(1) == tag
+
+
+def test_iter_elements(make_observation):
+    sources = list(iter_elements(io.BytesIO(wrapped(make_observation, 5)), 'dump.xml'))
+    assert [name for name, _ in sources] == [f'dump.xml#{i}' for i in range(5)]
+
+    # Each element is a document of its own, with its namespace declarations
+    for i, (_, xml) in enumerate(sources):
+        assert etree.fromstring(xml).tag == '{http://www.opencadc.org/caom2/xml/v2.4}Observation'
+        assert read_observation(('obs.xml', xml)).observation_id == f'{HST_ID}_{i}'
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_wrapped_stream(make_observation, compress):
+    content = wrapped(make_observation, 3)
+    if compress:
+        content = gzip.compress(content)
+    results = list(parse_files(iter_stream(io.BytesIO(content), 'dump.xml')))
+    assert [(name, error) for name, _, error, _ in results] == [(f'dump.xml#{i}', None) for i in range(3)]
+
+
+def test_sampled_validation():
+    names = [f'obs{i}.xml' for i in range(1000)]
+    sampled = [should_validate(name, .25) for name in names]
+    assert 200 < sum(sampled) < 300
+    # Repeatable
+    assert sampled == [should_validate(name, .25) for name in names]
+
+    assert not any(should_validate(name, 0.) for name in names)
+    assert all(should_validate(name, 1.) for name in names)
+    assert all(should_validate(name, True) for name in names)
+    assert not any(should_validate(name, False) for name in names)
+
+
+def test_sampled_invalid_rejected(make_observation):
+    invalid = make_observation(0, NOT_VALID)
+    names = [f'obs{i}.xml' for i in range(20)]
+    validated = [name for name in names if should_validate(name, .5)]
+    assert 0 < len(validated) < len(names)
+
+    results = {name: error for name, _, error, _ in parse_files([(name, invalid) for name in names], validate=.5)}
+    assert [name for name, error in results.items() if error is not None] == validated
+    assert all('not expected' in results[name] for name in validated)
+
+    # A valid document passes when sampled
+    assert read_observation((validated[0], make_observation(0)), .5).observation_id == f'{HST_ID}_0'
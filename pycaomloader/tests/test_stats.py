@@ -0,0 +1,77 @@
+import time
+from pycaomloader.load import parse_files
+from pycaomloader.stats import IngestStats
+
+
+def worker_stats(parse: float, flatten: float, files: int) -> dict:
+    stats = IngestStats()
+    stats.record('parse', parse, parse / 2)
+    stats.record('flatten', flatten, flatten)
+    stats.count('files', files)
+    return stats.to_dict()
+
+
+def test_merge():
+    stats = IngestStats()
+    stats.record('write', 1., .5)
+    stats.count('files', 1)
+    stats.merge(worker_stats(2., .25, 3))
+    stats.merge(worker_stats(4., .5, 5))
+
+    assert dict(stats.wall) == {'write': 1., 'parse': 6., 'flatten': .75}
+    assert dict(stats.cpu) == {'write': .5, 'parse': 3., 'flatten': .75}
+    assert dict(stats.calls) == {'write': 1, 'parse': 2, 'flatten': 2}
+    assert dict(stats.counters) == {'files': 9}
+
+
+def test_merge_workers(make_observation):
+    sources = [(f'obs{i}.xml', make_observation(i)) for i in range(6)]
+    stats = IngestStats()
+    results = list(parse_files(sources, workers=2, stats=stats))
+
+    assert [error for _, _, error, _ in results] == [None] * 6
+    assert stats.calls['parse'] == stats.calls['flatten'] == 6
+    assert stats.counters['bytes'] == sum(len(xml) for _, xml in sources)
+    assert stats.wall['parse'] > 0
+
+
+def test_to_prometheus(monkeypatch):
+    stats = IngestStats()
+    stats.record('parse', 1.5, 1.25)
+    stats.record('parse', .5, .25)
+    stats.count('files', 3)
+    stats.batch(2)
+    stats.batch(1)
+    stats.started = 10.
+    monkeypatch.setattr(time, 'perf_counter', lambda: 12.5)
+
+    assert stats.to_prometheus('caom') == '''\
+# TYPE caom_stage_wall_seconds counter
+caom_stage_wall_seconds{stage="parse"} 2.0
+# TYPE caom_stage_cpu_seconds counter
+caom_stage_cpu_seconds{stage="parse"} 1.5
+# TYPE caom_stage_calls_total counter
+caom_stage_calls_total{stage="parse"} 2
+# TYPE caom_files_total counter
+caom_files_total 3
+# TYPE caom_batches_total counter
+caom_batches_total 2
+# TYPE caom_batch_files_total counter
+caom_batch_files_total 3
+# TYPE caom_elapsed_seconds gauge
+caom_elapsed_seconds 2.5
+'''
+
+
+def test_hooks():
+    calls = []
+    stats = IngestStats(hooks=[lambda *args: calls.append(args)])
+    with stats.stage('write'):
+        pass
+    stats.record('commit', 2., 1.)
+    stats.merge(worker_stats(3., 1., 1))
+    stats.count('files')
+
+    assert [name for name, _, _ in calls] == ['write', 'commit', 'parse', 'flatten']
+    assert calls[1:] == [('commit', 2., 1.), ('parse', 3., 1.5), ('flatten', 1., 1.)]
+    assert all(wall >= 0 and cpu >= 0 for _, wall, cpu in calls)